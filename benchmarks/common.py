@@ -0,0 +1,198 @@
+"""Helpers shared by the benchmarks"""
+
+import atexit
+import compileall
+import ConfigParser
+import datetime
+import imp
+import logging
+import os.path
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmarks run from a checkout, against the code in it, without
+# leaving compiled files behind
+sys.dont_write_bytecode = True
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from everscript import EventCache, EverNote, MemoryBackend
+
+# Todo notebooks DiaryCmd reads, by configuration option
+NOTEBOOKS = {
+    "NextAction" : "Next Action",
+    "Pending" : "Pending",
+    "Scheduled" : "Scheduled",
+    }
+
+######################################################################
+#
+# Synthetic data
+
+def synthetic_backend(sizes, today=None, seed=0):
+    """Return MemoryBackend seeded with a notebook per name in sizes.
+
+    sizes maps notebook name to number of todos."""
+    backend = MemoryBackend()
+    for i, (notebook, count) in enumerate(sorted(sizes.items())):
+        backend.seed(count, notebook=notebook, today=today, seed=seed + i)
+    return backend
+
+def synthetic_icalbuddy(count, seed=0):
+    """Return text like icalBuddy's output for count events."""
+    rng = random.Random(seed)
+    lines = []
+    for i in xrange(count):
+        hour = rng.randint(1, 11)
+        lines.append("* Event number {}".format(i))
+        lines.append("    {}:00 AM - {}:30 AM".format(hour, hour))
+        if rng.random() < 0.5:
+            lines.append("    location: Room {} & Co".format(i))
+        if rng.random() < 0.3:
+            lines.append("    notes: Bring <slides>")
+            lines.append("@url: http://example.com/{}".format(i))
+            lines.append("@phone: 555-{:04d}".format(i % 10000))
+    return "\n".join(lines) + "\n"
+
+######################################################################
+#
+# Measurement
+
+class CountingBackend(object):
+    """Wraps a backend, counting calls to each method."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.calls = {}
+
+    def __getattr__(self, name):
+        function = getattr(self.backend, name)
+        if not callable(function):
+            return function
+        def counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return function(*args, **kwargs)
+        return counted
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+def use_backend(backend):
+    """Make EverNote use backend, counting calls. Returns CountingBackend."""
+    counting = CountingBackend(backend)
+    EverNote.set_backend(counting)
+    EverNote.set_cache(None)
+    EverNote.set_index(None)
+    return counting
+
+def peak_memory():
+    """Return peak resident memory of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def percentile(values, fraction):
+    """Return value at fraction (0 to 1) of sorted values."""
+    values = sorted(values)
+    index = int(round(fraction * (len(values) - 1)))
+    return values[index]
+
+def measure(function, min_time=0.5, min_runs=3, max_runs=50):
+    """Call function repeatedly, returning list of seconds per call.
+
+    Runs at least min_runs times and until min_time seconds have
+    passed, but no more than max_runs times."""
+    times = []
+    start = time.time()
+    while len(times) < max_runs:
+        before = time.time()
+        function()
+        times.append(time.time() - before)
+        if len(times) >= min_runs and time.time() - start >= min_time:
+            break
+    return times
+
+######################################################################
+
+def load_script(name):
+    """Import scripts/<name> as a module and return it."""
+    path = os.path.join(ROOT, "scripts", name)
+    module_name = "bench_" + os.path.splitext(name)[0].replace("-", "_")
+    return imp.load_source(module_name, path)
+
+def plugin_path():
+    """Return path of the plugins shipped with everscript."""
+    return os.path.join(ROOT, "plugins")
+
+def diary_config():
+    """Return configuration naming the NOTEBOOKS for DiaryCmd."""
+    config = ConfigParser.SafeConfigParser()
+    config.add_section("Diary")
+    config.set("Diary", "Notebook", "Diary")
+    config.set("Diary", "Template", "Template")
+    config.add_section("ToDos")
+    for option, notebook in NOTEBOOKS.items():
+        config.set("ToDos", option, notebook)
+    return config
+
+def diary_cmd():
+    """Return (evernote.py module, DiaryCmd) with output discarded."""
+    evernote = load_script("evernote.py")
+    logger = logging.getLogger("benchmark")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return evernote, evernote.DiaryCmd(config=diary_config(), logger=logger)
+
+def fake_icalbuddy(count, cache=False):
+    """Make subprocess.check_output() return count synthetic events.
+
+    Unless cache is True, events are parsed on every request rather
+    than served from EventCache."""
+    output = synthetic_icalbuddy(count)
+    def check_output(cmd):
+        if "-sd" not in cmd:
+            return output
+        # Events separated by date, the same events on each day
+        start, end = [datetime.date(*map(int, arg.split(":")[1].split("-")))
+                      for arg in cmd[-2:]]
+        sections = []
+        for n in xrange((end - start).days + 1):
+            heading = (start + datetime.timedelta(n)).isoformat() + ":"
+            sections.append("{}\n{}\n{}".format(heading, "-" * len(heading),
+                                                 output))
+        return "".join(sections)
+    subprocess.check_output = check_output
+    EventCache._shared = EventCache(max_age=300 if cache else 0)
+
+_compiled_copy = None
+
+def compiled_copy():
+    """Return directory holding a copy of the package and scripts with
+    their modules compiled, as when installed. Removed at exit."""
+    global _compiled_copy
+    if _compiled_copy is None:
+        _compiled_copy = tempfile.mkdtemp(prefix="everscript-bench-")
+        atexit.register(shutil.rmtree, _compiled_copy, True)
+        for name in ("everscript", "scripts"):
+            shutil.copytree(os.path.join(ROOT, name),
+                            os.path.join(_compiled_copy, name))
+        compileall.compile_dir(_compiled_copy, quiet=1)
+    return _compiled_copy
+
+def run_python(args):
+    """Return function running a fresh interpreter with args against
+    compiled_copy(), which is {root} in args."""
+    root = compiled_copy()
+    argv = [sys.executable] + [arg.format(root=root) for arg in args]
+    env = dict(os.environ, PYTHONPATH=root)
+    def run():
+        with open(os.devnull, "w") as devnull:
+            subprocess.check_call(argv, cwd=root, env=env,
+                                  stdout=devnull, stderr=devnull)
+    return run
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Micro-benchmark for ToDo.due_date() parsing
+
+Compares the regex plus strptime() implementation ToDo used to have
+against the current one, over synthetic todo titles.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import random
+import sys
+import time
+
+from everscript import ToDo
+
+######################################################################
+#
+# Previous implementation, kept as the baseline
+
+def old_parse_date(date_str):
+    formats = [
+        "%m/%d",
+        "%m/%d/%Y",
+        "%m/%d/%y",
+        ]
+    for format in formats:
+        try:
+            dt = datetime.datetime.strptime(date_str, format)
+            break
+        except ValueError:
+            pass
+    else:
+        return None
+    year, month, day = dt.year, dt.month, dt.day
+    if year == 1900:
+        year = datetime.date.today().year
+    return datetime.date(year, month, day)
+
+def old_due_date(title):
+    match = ToDo.DUE_REGEX.search(title)
+    if not match:
+        return None
+    return old_parse_date(match.group(1))
+
+######################################################################
+
+def synthetic_titles(count, seed=0):
+    """Return list of count todo titles, most with a due date."""
+    rng = random.Random(seed)
+    titles = []
+    for i in range(count):
+        month = rng.randint(1, 12)
+        day = rng.randint(1, 28)
+        form = rng.randint(0, 3)
+        if form == 0:
+            due = ""
+        elif form == 1:
+            due = " due:{}/{}".format(month, day)
+        elif form == 2:
+            due = " due:{}/{}/{}".format(month, day, rng.randint(2010, 2030))
+        else:
+            due = " due:{:02d}/{:02d}/{:02d}".format(month, day,
+                                                     rng.randint(10, 30))
+        titles.append("Task number {}{}".format(i, due))
+    return titles
+
+def make_todos(titles):
+    """Return list of ToDo instances with titles already cached."""
+    todos = []
+    for title in titles:
+        todo = ToDo(None)
+        todo.set_cached("title", title)
+        todos.append(todo)
+    return todos
+
+def timed(function):
+    """Return (seconds, result) for calling function()."""
+    start = time.time()
+    result = function()
+    return time.time() - start, result
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--count", type=int, default=100000,
+                        help="number of synthetic titles")
+    args = parser.parse_args(argv[1:])
+
+    titles = synthetic_titles(args.count)
+    todos = make_todos(titles)
+
+    old_time, old_dates = timed(lambda: [old_due_date(t) for t in titles])
+    cold_time, new_dates = timed(lambda: [t.due_date() for t in todos])
+    warm_time, _ = timed(lambda: [t.due_date() for t in todos])
+
+    if old_dates != new_dates:
+        print("Results differ from baseline")
+        return(1)
+
+    print("{} titles".format(args.count))
+    for label, seconds in [("baseline (regex + strptime)", old_time),
+                           ("due_date(), first call", cold_time),
+                           ("due_date(), repeat call", warm_time)]:
+        print("{:30s} {:8.3f}s {:10.0f} titles/s".format(
+            label, seconds, args.count / seconds if seconds else 0))
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
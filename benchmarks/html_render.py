@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""Benchmark and regression check for HTMLRenderer
+
+Compares HTMLRenderer against the string concatenation DiaryCmd and
+the events plugin used to do, checking the output is byte-identical.
+"""
+from __future__ import print_function
+
+import argparse
+import cgi
+import sys
+import time
+
+import common
+from everscript import HTMLRenderer, ToDo
+
+######################################################################
+#
+# Previous implementations, kept as the baseline
+
+def old_todos_to_html(todos):
+    html = "<ul>\n"
+    for todo in todos:
+        try:
+            html += "<li>{}</li>\n".format(cgi.escape(todo.title()))
+        except Exception as e:
+            pass
+    html += "</ul>\n"
+    return html
+
+def old_events_to_html(events):
+    html = "<ul>\n"
+    for event in events:
+        html += "<li>{} {}".format(cgi.escape(event.time),
+                                   cgi.escape(event.title))
+        html += "<ul>"
+        if event.location != "":
+            html += "<li>{}</li>".format(cgi.escape(event.location))
+        if event.url:
+            html += "<li>{}</li>".format(cgi.escape(event.url))
+        if event.phone:
+            html += "<li>{}</li>".format(cgi.escape(event.phone))
+        if event.note:
+            html += "<li>{}</li>".format(cgi.escape(event.note))
+        html += "</ul></li>\n"
+    html += "</ul>\n"
+    return html
+
+######################################################################
+
+def synthetic_todos(count):
+    todos = []
+    for i in range(count):
+        todo = ToDo(None)
+        todo.set_cached("title", "Call <Bob> & Alice #{} due:1/{}".format(
+                i, i % 28 + 1))
+        todos.append(todo)
+    # One title which cannot be rendered, to check errors match too
+    todo = ToDo(None)
+    todo.set_cached("title", u"Caf\xe9")
+    todos.append(todo)
+    return todos
+
+def synthetic_events(count):
+    common.fake_icalbuddy(count)
+    evernote, diary = common.diary_cmd()
+    return diary.get_events()
+
+def timed(function):
+    start = time.time()
+    result = function()
+    return time.time() - start, result
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--count", type=int, default=10000,
+                        help="number of todos and events")
+    args = parser.parse_args(argv[1:])
+
+    todos = synthetic_todos(args.count)
+    events = synthetic_events(args.count)
+    pairs = [
+        ("todos", lambda: old_todos_to_html(todos),
+         lambda: HTMLRenderer().todo_list(todos).getvalue()),
+        ("events", lambda: old_events_to_html(events),
+         lambda: HTMLRenderer().event_list(events).getvalue()),
+        ]
+    print("{} items".format(args.count))
+    for name, old, new in pairs:
+        old_time, old_html = timed(old)
+        new_time, new_html = timed(new)
+        if old_html != new_html:
+            print("{}: output differs from baseline".format(name))
+            return(1)
+        print("{:8s} baseline {:8.3f}s  HTMLRenderer {:8.3f}s".format(
+                name, old_time, new_time))
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+#!/usr/bin/env python
+"""Benchmark suite for the todo and diary pipelines
+
+Runs every benchmark case at each size on synthetic notebooks held by
+the in-memory backend (and synthetic icalBuddy output), each in its own
+process so peak memory is per case. startup_* cases time fresh
+interpreters, so their peak memory is that of the benchmark. Reports
+throughput, p50/p99 latency, backend calls per run and peak memory,
+and writes the results as JSON to benchmarks/results/ so runs of
+different versions can be compared with --compare.
+
+Usage: python benchmarks/run.py [--sizes 100,1000000] [--case todos_bin]
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import json
+import os
+import os.path
+import random
+import subprocess
+import sys
+import time
+
+import common
+from everscript import AsyncEverNote, EverNote, LatencyBackend, \
+     MemoryBackend, NoteIndex, PluginCache, Template, TemplateCache, ToDo, \
+     ToDos, ToDoTable
+
+# Default number of todos per notebook. Event cases use a tenth as
+# many events.
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+######################################################################
+#
+# Cases
+#
+# Each case takes a size and returns (function to time, number of
+# items it handles per call, CountingBackend or None).
+
+def fresh_todos(titles):
+    """Return ToDos with titles already cached, as after a prefetch."""
+    items = []
+    for title in titles:
+        todo = ToDo(None)
+        todo.set_cached("title", title)
+        items.append(todo)
+    return ToDos._from_items(items)
+
+def notebook_titles(size):
+    backend = common.synthetic_backend({"Next Action" : size})
+    return [note.title for note in backend.notebooks["Next Action"]]
+
+def case_todos_fetch(size):
+    """Read a notebook and fetch all titles through the backend."""
+    counting = common.use_backend(
+        common.synthetic_backend({"Next Action" : size}))
+    return (lambda: ToDos("Next Action").prefetch("title"), size, counting)
+
+def case_todos_filter(size):
+    """ToDos.past_due() over todos with fetched titles."""
+    titles = notebook_titles(size)
+    return (lambda: fresh_todos(titles).past_due(), size, None)
+
+def case_todos_bin(size):
+    """ToDos.bin_by_due_date() over todos with fetched titles."""
+    titles = notebook_titles(size)
+    return (lambda: fresh_todos(titles).bin_by_due_date(), size, None)
+
+def case_table_build(size):
+    """ToDoTable built from titles, parsing each due date."""
+    titles = notebook_titles(size)
+    def build():
+        table = ToDoTable()
+        table.extend(titles)
+        return table
+    return (build, size, None)
+
+def case_table_filter(size):
+    """ToDoTable.past_due() and due_soon() over a built table."""
+    table = ToDoTable()
+    table.extend(notebook_titles(size))
+    return (lambda: (table.past_due(), table.due_soon()), size, None)
+
+def case_todos_sync(size):
+    """ToDos.cached_bins() with one todo in a hundred changed per call."""
+    backend = common.synthetic_backend({"Next Action" : size})
+    counting = common.use_backend(backend)
+    ToDos.cached_bins("Next Action")
+    notes = backend.notebooks["Next Action"]
+    rng = random.Random(0)
+    def refresh():
+        for i in xrange(max(1, size // 100)):
+            note = rng.choice(notes)
+            backend.update_note(note, title=note.title)
+        return ToDos.cached_bins("Next Action")
+    return (refresh, size, counting)
+
+def case_title_search(size):
+    """EverNote.find_note_by_title() searching the app."""
+    backend = common.synthetic_backend({"Next Action" : size})
+    counting = common.use_backend(backend)
+    titles = [note.title for note in backend.notebooks["Next Action"]]
+    rng = random.Random(0)
+    return (lambda: EverNote.find_note_by_title(rng.choice(titles),
+                                                notebook="Next Action"),
+            1, counting)
+
+def case_title_index(size):
+    """EverNote.find_note_by_title() answered by a built NoteIndex."""
+    backend = common.synthetic_backend({"Next Action" : size})
+    counting = common.use_backend(backend)
+    titles = [note.title for note in backend.notebooks["Next Action"]]
+    EverNote.set_index(NoteIndex(max_age=3600))
+    EverNote.find_note_by_title(titles[0], notebook="Next Action")
+    rng = random.Random(0)
+    return (lambda: EverNote.find_note_by_title(rng.choice(titles),
+                                                notebook="Next Action"),
+            1, counting)
+
+def case_index_due(size):
+    """NoteIndex.due_between() for the coming week."""
+    counting = common.use_backend(
+        common.synthetic_backend({"Next Action" : size}))
+    index = NoteIndex(max_age=3600)
+    today = datetime.date.today()
+    week = (today, today + datetime.timedelta(7))
+    count = len(index.due_between(week[0], week[1], "Next Action"))
+    return (lambda: index.due_between(week[0], week[1], "Next Action"),
+            count, counting)
+
+def case_due_date(size):
+    """ToDo.due_date() on todos which have not parsed their date yet."""
+    todos = fresh_todos(notebook_titles(size))
+    def parse():
+        ToDo._parse_cache.clear()
+        for todo in todos:
+            todo._due_date_key = None
+            todo.due_date()
+    return (parse, size, None)
+
+def case_diary_todos(size):
+    """DiaryCmd.get_todos_as_html() with size todos in each notebook."""
+    counting = common.use_backend(common.synthetic_backend(
+            dict((notebook, size) for notebook in common.NOTEBOOKS.values())))
+    evernote, diary = common.diary_cmd()
+    return (diary.get_todos_as_html, size * len(common.NOTEBOOKS), counting)
+
+def case_todos_html(size):
+    """DiaryCmd.todos_to_html() over todos with fetched titles."""
+    titles = notebook_titles(size)
+    evernote, diary = common.diary_cmd()
+    todos = fresh_todos(titles)
+    return (lambda: diary.todos_to_html(todos), size, None)
+
+def case_events_parse(size):
+    """DiaryCmd.get_events() parsing icalBuddy output."""
+    count = max(1, size // 10)
+    common.fake_icalbuddy(count)
+    evernote, diary = common.diary_cmd()
+    return (diary.get_events, count, None)
+
+def case_events_cached(size):
+    """DiaryCmd.get_events() served from a warm EventCache."""
+    count = max(1, size // 10)
+    common.fake_icalbuddy(count, cache=True)
+    evernote, diary = common.diary_cmd()
+    diary.get_events()
+    return (diary.get_events, count, None)
+
+def case_events_html(size):
+    """DiaryCmd.events_to_html() over parsed events."""
+    count = max(1, size // 10)
+    common.fake_icalbuddy(count)
+    evernote, diary = common.diary_cmd()
+    events = diary.get_events()
+    return (lambda: diary.events_to_html(events), count, None)
+
+def case_plugin_format(size):
+    """PlugInFormatter.format() of a template using the events plugin."""
+    count = max(1, size // 10)
+    common.fake_icalbuddy(count)
+    en_diary = common.load_script("en-diary.py")
+    config = en_diary.MyConfigParser()
+    template = "<div>{events}</div>"
+    def format():
+        formatter = en_diary.PlugInFormatter(common.plugin_path(),
+                                             config=config)
+        return formatter.format(template)
+    return (format, count, None)
+
+def case_plugin_cached(size):
+    """PlugInFormatter.render() with the events plugin's output in a
+    warm PluginCache."""
+    count = max(1, size // 10)
+    common.fake_icalbuddy(count)
+    en_diary = common.load_script("en-diary.py")
+    config = en_diary.MyConfigParser()
+    template = Template("<div>{events}</div>")
+    cache = PluginCache()
+    def render():
+        formatter = en_diary.PlugInFormatter(common.plugin_path(),
+                                             config=config,
+                                             plugin_cache=cache)
+        return formatter.render(template)
+    render()
+    return (render, count, None)
+
+def template_source(count):
+    """Return template of count paragraphs, each with a field."""
+    return "".join("<p>Section {} {{{{}}}}: {{todos}}</p>\n".format(i)
+                   for i in xrange(count))
+
+def case_template_format(size):
+    """str.format() of a diary template, parsing it every time."""
+    count = max(1, size // 10)
+    source = template_source(count)
+    return (lambda: source.format(todos="<ul></ul>"), count, None)
+
+def case_template_cached(size):
+    """Template from a warm TemplateCache, then rendered."""
+    count = max(1, size // 10)
+    backend = MemoryBackend()
+    note = backend.add_note("Template", "Diary", html=template_source(count))
+    counting = common.use_backend(backend)
+    cache = TemplateCache()
+    def render():
+        template_note = EverNote.find_note_by_title("Template", "Diary")
+        return cache.template(template_note).format(todos="<ul></ul>")
+    render()
+    return (render, count, counting)
+
+def case_diary_backfill(size):
+    """DiaryCmd.backfill() of a week of diaries, with size todos in each
+    notebook and a tenth as many events a day."""
+    backend = common.synthetic_backend(
+        dict((notebook, size) for notebook in common.NOTEBOOKS.values()))
+    backend.add_note("Template", "Diary",
+                     html="<div>{events}</div><div>{todos}</div>")
+    counting = common.use_backend(backend)
+    common.fake_icalbuddy(max(1, size // 10))
+    TemplateCache._shared = TemplateCache()
+    evernote, diary = common.diary_cmd()
+    args = argparse.Namespace(force=True, jobs=4)
+    start = datetime.date.today() - datetime.timedelta(6)
+    return (lambda: diary.backfill(start, datetime.date.today(), args),
+            7, counting)
+
+def case_notes_create(size):
+    """AsyncEverNote.create_notes() with 1ms simulated latency per call."""
+    count = max(1, size // 10)
+    counting = common.use_backend(LatencyBackend(MemoryBackend(),
+                                                 latency=0.001))
+    specs = [{ "title" : "Note {}".format(i), "text" : "Body {}".format(i),
+               "notebook" : "Import" } for i in xrange(count)]
+    return (lambda: list(AsyncEverNote.create_notes(specs)), count, counting)
+
+def case_startup_python(size):
+    """A fresh interpreter doing nothing, to compare the others with."""
+    return (common.run_python(["-c", "pass"]), 1, None)
+
+def case_startup_import(size):
+    """A fresh interpreter importing everscript."""
+    return (common.run_python(["-c", "import everscript"]), 1, None)
+
+def case_startup_help(size):
+    """evernote.py --help in a fresh interpreter."""
+    return (common.run_python(["{root}/scripts/evernote.py", "--help"]),
+            1, None)
+
+def case_startup_todos(size):
+    """evernote.py todos --past on size in-memory todos, in a fresh
+    interpreter."""
+    return (common.run_python(["{root}/scripts/evernote.py",
+                               "-c", os.devnull, "--no-daemon",
+                               "--memory", str(size), "todos", "--past"]),
+            size, None)
+
+CASES = [
+    ("todos_fetch", case_todos_fetch),
+    ("todos_filter", case_todos_filter),
+    ("todos_bin", case_todos_bin),
+    ("table_build", case_table_build),
+    ("table_filter", case_table_filter),
+    ("todos_sync", case_todos_sync),
+    ("title_search", case_title_search),
+    ("title_index", case_title_index),
+    ("index_due", case_index_due),
+    ("due_date", case_due_date),
+    ("diary_todos", case_diary_todos),
+    ("todos_html", case_todos_html),
+    ("events_parse", case_events_parse),
+    ("events_cached", case_events_cached),
+    ("events_html", case_events_html),
+    ("plugin_format", case_plugin_format),
+    ("plugin_cached", case_plugin_cached),
+    ("template_format", case_template_format),
+    ("template_cached", case_template_cached),
+    ("diary_backfill", case_diary_backfill),
+    ("notes_create", case_notes_create),
+    ("startup_python", case_startup_python),
+    ("startup_import", case_startup_import),
+    ("startup_help", case_startup_help),
+    ("startup_todos", case_startup_todos),
+    ]
+
+######################################################################
+
+def run_case(name, size):
+    """Run one case in this process, returning dictionary of results."""
+    setup = dict(CASES)[name]
+    function, items, counting = setup(size)
+    if counting:
+        counting.calls.clear()
+    times = common.measure(function)
+    p50 = common.percentile(times, 0.5)
+    return {
+        "case" : name,
+        "size" : size,
+        "items" : items,
+        "runs" : len(times),
+        "p50" : p50,
+        "p99" : common.percentile(times, 0.99),
+        "throughput" : items / p50 if p50 else None,
+        "app_calls" : (float(counting.total_calls()) / len(times)
+                       if counting else None),
+        "peak_memory" : common.peak_memory(),
+        }
+
+def run_subprocess(name, size):
+    """Run one case in a child process, returning its results."""
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                   "--child", name, str(size)])
+    return json.loads(out.splitlines()[-1])
+
+def version():
+    """Return git description of the checkout, or None."""
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(
+                ["git", "describe", "--always", "--dirty"],
+                cwd=common.ROOT, stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def report(results, baseline=None):
+    """Print table of results, with p50 ratio to baseline if given."""
+    previous = {}
+    if baseline:
+        previous = dict(((r["case"], r["size"]), r)
+                        for r in baseline["results"])
+    print("{:14s} {:>8s} {:>12s} {:>10s} {:>10s} {:>10s} {:>8s}{}".format(
+            "case", "size", "items/s", "p50 ms", "p99 ms", "calls",
+            "peak MB", "  vs baseline" if baseline else ""))
+    for r in results:
+        line = "{:14s} {:>8d} {:>12.0f} {:>10.2f} {:>10.2f} {:>10s} {:>8.1f}".format(
+            r["case"], r["size"], r["throughput"] or 0,
+            r["p50"] * 1000, r["p99"] * 1000,
+            "{:.0f}".format(r["app_calls"])
+            if r["app_calls"] is not None else "-",
+            r["peak_memory"] / 1e6)
+        old = previous.get((r["case"], r["size"]))
+        if old:
+            ratio = r["p50"] / old["p50"] if old["p50"] else 0
+            line += "  {:.2f}x{}".format(
+                ratio, " REGRESSION" if ratio > 1.2 else "")
+        print(line)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes",
+                        default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma-separated todo counts"
+                        " (e.g. 100,1000000)")
+    parser.add_argument("--case", action="append", dest="cases",
+                        choices=[name for name, setup in CASES],
+                        help="run only this case (may be repeated)")
+    parser.add_argument("-o", "--output",
+                        help="JSON results file"
+                        " (default: benchmarks/results/<version>.json)")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare with results in FILE")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv[1:])
+
+    if args.child:
+        name, size = args.child
+        print(json.dumps(run_case(name, int(size))))
+        return(0)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    names = args.cases or [name for name, setup in CASES]
+    results = []
+    for name in names:
+        for size in sizes:
+            results.append(run_subprocess(name, size))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    run = {
+        "version" : version(),
+        "date" : datetime.datetime.now().isoformat(),
+        "python" : sys.version.split()[0],
+        "results" : results,
+        }
+    output = args.output
+    if not output:
+        directory = os.path.join(common.ROOT, "benchmarks", "results")
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        output = os.path.join(directory, "{}.json".format(
+                run["version"] or time.strftime("%Y%m%d-%H%M%S")))
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2)
+    print("Results written to {}".format(output))
+    return(0)
+
+if __name__ == "__main__":
+    sys.exit(main())
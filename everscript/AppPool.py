@@ -0,0 +1,61 @@
+"""Process-wide pool of appscript application handles"""
+
+import threading
+
+class AppPool(object):
+    """Shared appscript application handles, keyed by application name.
+
+    Handles are created lazily on first use and shared by all callers
+    and threads, so application lookup and terminology loading happen
+    once per process rather than once per call. appscript itself is
+    not imported until a handle is needed."""
+
+    # Apple Event error numbers meaning the handle no longer refers to a
+    # running application (it quit or was restarted):
+    #   -600: application isn't running
+    #   -609: connection is invalid
+    RECONNECT_ERRORS = (-600, -609)
+
+    _apps = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, app_name="EverNote"):
+        """Return the shared handle for app_name, creating it if needed."""
+        with cls._lock:
+            app = cls._apps.get(app_name)
+            if app is None:
+                import appscript
+                app = appscript.app(app_name)
+                cls._apps[app_name] = app
+            return app
+
+    @classmethod
+    def discard(cls, app_name="EverNote"):
+        """Drop the handle for app_name so the next get() reconnects."""
+        with cls._lock:
+            cls._apps.pop(app_name, None)
+
+    @classmethod
+    def call(cls, function, app_name="EverNote", retry=True):
+        """Return function(app) called with the shared handle for app_name.
+
+        If the call fails because the application has quit or restarted,
+        the handle is dropped so the next call reconnects, and if retry
+        is true the call is tried once more on the new handle.
+
+        Pass retry=False when function uses references obtained from
+        the old handle (e.g. notes returned by an earlier call): they
+        still point at the process which went away, so a retry would
+        only fail again, with a less helpful error. The original error
+        is raised instead; callers can look the notes up again by link."""
+        import appscript
+        try:
+            return function(cls.get(app_name))
+        except appscript.reference.CommandError as e:
+            if e.errornumber not in cls.RECONNECT_ERRORS:
+                raise
+            cls.discard(app_name)
+            if not retry:
+                raise
+            return function(cls.get(app_name))
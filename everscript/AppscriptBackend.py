@@ -0,0 +1,118 @@
+"""Backend talking to the EverNote application via appscript"""
+
+from AppPool import AppPool
+from Backend import Backend
+from EverNoteException import EverNoteException
+
+class AppscriptBackend(Backend):
+    """Sends each call to the application as an Apple Event.
+
+    Uses the shared handle from AppPool. appscript is only imported
+    on the first call."""
+
+    def __init__(self, app_name="EverNote"):
+        self.app_name = app_name
+
+    def _call(self, function, retry=True):
+        """Return function(app) using the shared application handle.
+
+        retry should be False if function uses references from earlier
+        calls (see AppPool.call())."""
+        with AppCallContextManager():
+            return AppPool.call(function, self.app_name, retry=retry)
+
+    def create_note(self, title, notebook=None, with_html=None,
+                    with_text=None):
+        kwargs={
+            "title":title,
+            "notebook":notebook,
+            }
+        if with_html is not None:
+            kwargs["with_html"] = with_html
+        if with_text is not None:
+            kwargs["with_text"] = with_text
+        return self._call(lambda app: app.create_note(**kwargs))
+
+    def find_notes(self, query):
+        return self._call(lambda app: app.find_notes(query))
+
+    def find_note(self, link):
+        return self._call(lambda app: app.find_note(link))
+
+    def get(self, reference, name):
+        with AppCallContextManager():
+            return getattr(reference, name).get()
+
+    def get_properties(self, references, name):
+        """Return property name for every reference with one get event.
+
+        If the app cannot resolve a list of references in one event,
+        falls back to fetching each value in turn. Not retried if the
+        app has restarted, as references are to the old process."""
+        if not references:
+            return []
+        properties = [getattr(reference, name) for reference in references]
+        try:
+            return self._call(lambda app: app.get(properties), retry=False)
+        except EverNoteException as e:
+            if e.number in AppPool.RECONNECT_ERRORS:
+                raise
+            with AppCallContextManager():
+                return [p.get() for p in properties]
+
+    def count_notes(self, notebook):
+        import appscript
+        return self._call(lambda app: app.notebooks[notebook].notes.count(
+                each=appscript.k.note))
+
+    def notebook_notes(self, notebook, start, end):
+        if start >= end:
+            return []
+        # appscript element ranges are 1-based and inclusive
+        return self._call(
+            lambda app: app.notebooks[notebook].notes[start + 1:end].get())
+
+    def modification_dates(self, notebook):
+        return self._call(
+            lambda app: app.notebooks[notebook].notes.modification_date.get())
+
+    def note_versions(self, notebook):
+        """Return links and modification dates from bulk get events.
+
+        Links and dates are separate events, so dates are fetched
+        again to check no note changed in between."""
+        def get(app):
+            notes = app.notebooks[notebook].notes
+            for attempt in range(3):
+                dates = notes.modification_date.get()
+                links = notes.note_link.get()
+                if notes.modification_date.get() == dates:
+                    return zip(links, dates)
+            raise EverNoteException("Notebook changed while being read",
+                                    notebook)
+        return self._call(get)
+
+    def open_collection_window(self, query_string=None):
+        # TODO: handle other arguments besides query_string
+        kwargs={}
+        if query_string:
+            kwargs["with_query_string"] = query_string
+        return self._call(lambda app: app.open_collection_window(**kwargs))
+
+    def open_note_window(self, reference):
+        return self._call(lambda app: app.open_note_window(with_=reference),
+                          retry=False)
+
+class AppCallContextManager:
+    """Context manager for calls to appscript app"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        if type is None:
+            return
+        import appscript
+        if type == appscript.reference.CommandError:
+            raise EverNoteException(value.errormessage,
+                                    str(value),
+                                    number=value.errornumber)
@@ -0,0 +1,144 @@
+"""Run EverNote queries concurrently"""
+
+from collections import deque, namedtuple
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+from EverNote import EverNote
+from EverNoteException import EverNoteException
+from ToDos import ToDos
+
+# Result of creating one note with AsyncEverNote.create_notes(). note is
+# the created Note, or None if creation failed with exception error.
+# attempts is the number of times creation was tried.
+CreateResult = namedtuple("CreateResult",
+                          ["spec", "note", "error", "attempts"])
+
+class AsyncEverNote(object):
+    """Runs EverNote calls on a shared, bounded pool of threads.
+
+    Methods return immediately with a multiprocessing AsyncResult;
+    call get() on it to wait for the value. get() re-raises any
+    exception (e.g. EverNoteException) raised by the call. Independent
+    queries submitted together take about as long as the slowest one
+    rather than the sum of all of them."""
+
+    # Maximum number of calls running at once
+    max_workers = 4
+
+    _pool = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_pool(cls):
+        """Return the shared thread pool, creating it if needed."""
+        with cls._lock:
+            if cls._pool is None:
+                cls._pool = ThreadPool(cls.max_workers)
+            return cls._pool
+
+    @classmethod
+    def submit(cls, function, *args, **kwargs):
+        """Run function(*args, **kwargs) on the pool. Returns AsyncResult."""
+        return cls._get_pool().apply_async(function, args, kwargs)
+
+    @classmethod
+    def find_notes(cls, search_term, notebook=None):
+        """Asynchronous EverNote.find_notes(). Returns AsyncResult."""
+        return cls.submit(EverNote.find_notes, search_term, notebook=notebook)
+
+    @classmethod
+    def find_note_by_title(cls, title, notebook=None):
+        """Asynchronous EverNote.find_note_by_title(). Returns AsyncResult."""
+        return cls.submit(EverNote.find_note_by_title, title,
+                          notebook=notebook)
+
+    @classmethod
+    def todos(cls, notebook, search_term=""):
+        """Return AsyncResult for ToDos in notebook with titles fetched."""
+        def fetch():
+            return ToDos(notebook, search_term=search_term).prefetch("title")
+        return cls.submit(fetch)
+
+    @classmethod
+    def gather(cls, results, timeout=None):
+        """Wait for every AsyncResult in results, returning their values.
+
+        Values are in the same order as results. timeout, if given,
+        applies to each result in turn."""
+        return [result.get(timeout) for result in results]
+
+    @classmethod
+    def gather_notebooks(cls, notebooks, timeout=None):
+        """Return list of ToDos, one per notebook, fetched concurrently.
+
+        A notebook of None gives an empty ToDos without an app call."""
+        results = [cls.todos(notebook) if notebook else None
+                   for notebook in notebooks]
+        return [result.get(timeout) if result else ToDos()
+                for result in results]
+
+    @classmethod
+    def create_note(cls, spec, retries=2, retry_delay=1.0):
+        """Create the note described by spec, returning a CreateResult.
+
+        spec is a dictionary with a title and optionally html or text
+        content and a notebook. Transient errors (see
+        EverNoteException.is_transient()) are retried up to retries
+        times, waiting retry_delay seconds before the first retry and
+        twice as long before each one after. An event which timed out
+        may still have created its note, so a retry can duplicate it.
+        Any other exception fails the result without a retry.
+        Blocks; see create_notes() to create notes concurrently."""
+        attempts = 0
+        delay = retry_delay
+        while True:
+            attempts += 1
+            try:
+                note = EverNote.create_note(with_html=spec.get("html"),
+                                            with_text=spec.get("text"),
+                                            title=spec.get("title", ""),
+                                            notebook=spec.get("notebook"))
+                return CreateResult(spec, note, None, attempts)
+            except EverNoteException as e:
+                if not e.is_transient() or attempts > retries:
+                    return CreateResult(spec, None, e, attempts)
+            except Exception as e:
+                # e.g. ImportError without appscript: fails this spec
+                # rather than the whole batch, and is not retried
+                return CreateResult(spec, None, e, attempts)
+            time.sleep(delay)
+            delay *= 2
+
+    @classmethod
+    def create_notes(cls, specs, retries=2, retry_delay=1.0, window=None,
+                     workers=None):
+        """Create a note for each spec in specs on the pool.
+
+        Yields a CreateResult for each spec, in the order of specs,
+        as creations complete (see create_note() for specs and
+        retries). specs may be any iterable, such as a stream read
+        from a file: it is read only as far as window (default twice
+        the number of workers) creations ahead of the results yielded.
+
+        workers, if given, is the number of creations run at once, on
+        a pool of their own; otherwise they run on the shared pool."""
+        if workers:
+            pool = ThreadPool(workers)
+        else:
+            pool = cls._get_pool()
+        window = window or 2 * (workers or cls.max_workers)
+        pending = deque()
+        try:
+            for spec in specs:
+                pending.append(pool.apply_async(
+                        cls.create_note, (spec,),
+                        dict(retries=retries, retry_delay=retry_delay)))
+                if len(pending) >= window:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            if workers:
+                pool.close()
@@ -0,0 +1,68 @@
+"""Backend abstract base class"""
+
+import abc
+
+class Backend(object):
+    """Store of notes that EverNote talks to.
+
+    Notes are identified by references, which are opaque to everything
+    but the backend that returned them. Each method is one round trip
+    to the store. Errors are raised as EverNoteException."""
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def create_note(self, title, notebook=None, with_html=None,
+                    with_text=None):
+        """Create a note, returning its reference."""
+        return
+
+    @abc.abstractmethod
+    def find_notes(self, query):
+        """Return list of references to notes matching EverNote search query."""
+        return
+
+    @abc.abstractmethod
+    def find_note(self, link):
+        """Return reference to note with the given note link."""
+        return
+
+    @abc.abstractmethod
+    def get(self, reference, name):
+        """Return property name of a note."""
+        return
+
+    @abc.abstractmethod
+    def get_properties(self, references, name):
+        """Return list of property name for each of references, in order."""
+        return
+
+    @abc.abstractmethod
+    def count_notes(self, notebook):
+        """Return number of notes in notebook."""
+        return
+
+    @abc.abstractmethod
+    def notebook_notes(self, notebook, start, end):
+        """Return references to notes start to end - 1 of notebook."""
+        return
+
+    @abc.abstractmethod
+    def modification_dates(self, notebook):
+        """Return list of modification dates of all notes in notebook."""
+        return
+
+    @abc.abstractmethod
+    def note_versions(self, notebook):
+        """Return list of (note link, modification date) for all notes
+        in notebook, in notebook order."""
+        return
+
+    @abc.abstractmethod
+    def open_collection_window(self, query_string=None):
+        """Open a collection window, returning it."""
+        return
+
+    @abc.abstractmethod
+    def open_note_window(self, reference):
+        """Open a window on a note, returning it."""
+        return
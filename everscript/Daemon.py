@@ -0,0 +1,219 @@
+"""Resident server running commands sent over a Unix domain socket"""
+
+import json
+import logging
+import os
+import os.path
+import socket
+import SocketServer
+import time
+
+class DaemonException(Exception):
+    """Error talking to the daemon"""
+    pass
+
+class _ReplyHandler(logging.Handler):
+    """Sends each log record to the client as a line of JSON.
+
+    Lines are buffered and sent at most every flush_interval seconds,
+    rather than a write per message."""
+
+    flush_interval = 0.1
+
+    def __init__(self, wfile):
+        logging.Handler.__init__(self)
+        self.wfile = wfile
+        self.flushed = time.time()
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, record):
+        try:
+            self.wfile.write(json.dumps({"level" : record.levelno,
+                                         "message" : self.format(record)})
+                             + "\n")
+            if time.time() - self.flushed > self.flush_interval:
+                self.wfile.flush()
+                self.flushed = time.time()
+        except socket.error:
+            # Client went away; the command still runs to completion
+            pass
+        except Exception:
+            self.handleError(record)
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    """Passes each connection to the Daemon which owns the server."""
+
+    # Buffer replies; _ReplyHandler and Daemon._reply() flush them
+    wbufsize = -1
+
+    def handle(self):
+        self.server.owner._handle(self.rfile, self.wfile)
+
+    def finish(self):
+        try:
+            SocketServer.StreamRequestHandler.finish(self)
+        except socket.error:
+            # Client went away before reading everything
+            pass
+
+class Daemon(object):
+    """Runs commands for clients connecting to a Unix domain socket.
+
+    A request is a line of JSON holding the command's arguments and
+    the client's working directory. Output is sent back as the command
+    logs it, one line of JSON per message, followed by a line with the
+    command's exit status.
+
+    Connections are handled one at a time, so commands share the
+    process's app connection and caches without racing each other.
+    The cost is that a long command, such as a diary backfill, holds
+    up every other client until it finishes; those clients wait for
+    it rather than running the command themselves."""
+
+    DEFAULT_PATH = "~/.evernote/daemon.sock"
+
+    def __init__(self, handler, path=DEFAULT_PATH, logger=None):
+        """handler is called as handler(argv, output, cwd) for each
+        request, where output is a logging.Logger whose messages go to
+        the client and cwd is the client's working directory (None if
+        not sent), against which relative paths in argv should be
+        resolved. It returns the command's exit status."""
+        self.handler = handler
+        self.path = os.path.expanduser(path)
+        self.logger = logger
+        self._stopping = False
+
+    def _debug(self, msg):
+        if self.logger:
+            self.logger.debug(msg)
+
+    def serve(self):
+        """Serve requests until a client asks the daemon to stop.
+
+        Raises DaemonException if a daemon is already serving path."""
+        if self.is_running(self.path):
+            raise DaemonException(
+                "Daemon already running on {}".format(self.path))
+        if os.path.exists(self.path):
+            # Left behind by a daemon which did not exit cleanly
+            os.unlink(self.path)
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # Only this user may connect
+        umask = os.umask(0o077)
+        try:
+            server = SocketServer.UnixStreamServer(self.path, _RequestHandler)
+        finally:
+            os.umask(umask)
+        server.owner = self
+        try:
+            while not self._stopping:
+                server.handle_request()
+        finally:
+            server.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _handle(self, rfile, wfile):
+        """Handle one request read from rfile, replying to wfile."""
+        line = rfile.readline()
+        if not line:
+            # Connection closed without a request, e.g. by is_running()
+            return
+        try:
+            request = json.loads(line)
+        except ValueError:
+            self._reply(wfile, {"result" : 1})
+            return
+        if request.get("stop"):
+            self._debug("Stop requested")
+            self._stopping = True
+            self._reply(wfile, {"result" : 0})
+            return
+        argv = request.get("argv", [])
+        self._debug("Request: {}".format(" ".join(argv)))
+        output = logging.Logger("everscript.daemon.request")
+        output.addHandler(_ReplyHandler(wfile))
+        try:
+            result = self.handler(argv, output, request.get("cwd"))
+        except SystemExit as e:
+            # argparse exits on bad arguments
+            result = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            output.error("Error in daemon: {}".format(str(e)))
+            result = 1
+        self._reply(wfile, {"result" : result})
+
+    def _reply(self, wfile, reply):
+        try:
+            wfile.write(json.dumps(reply) + "\n")
+            wfile.flush()
+        except socket.error:
+            pass
+
+    #
+    # Client functions
+
+    @classmethod
+    def _connect(cls, path):
+        """Return socket connected to daemon at path, or None."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(os.path.expanduser(path))
+        except socket.error:
+            sock.close()
+            return None
+        return sock
+
+    @classmethod
+    def is_running(cls, path=DEFAULT_PATH):
+        """Return True if a daemon is accepting requests on path."""
+        sock = cls._connect(path)
+        if sock is None:
+            return False
+        sock.close()
+        return True
+
+    @classmethod
+    def call(cls, argv, output, path=DEFAULT_PATH):
+        """Run the command given by list of arguments argv in the daemon.
+
+        Messages from the command are logged to output, a
+        logging.Logger, as they arrive. The current directory is sent
+        with argv, so relative paths in it mean the same as here.
+        Returns the command's exit status, or None if no daemon is
+        running, in which case the caller should run the command
+        itself. Raises DaemonException if the daemon goes away during
+        the command."""
+        sock = cls._connect(path)
+        if sock is None:
+            return None
+        try:
+            sock.sendall(json.dumps({"argv" : list(argv),
+                                     "cwd" : os.getcwd()}) + "\n")
+            for line in sock.makefile("rb"):
+                reply = json.loads(line)
+                if "result" in reply:
+                    return reply["result"]
+                output.log(reply["level"], reply["message"])
+        except (socket.error, ValueError) as e:
+            raise DaemonException("Error talking to daemon: " + str(e))
+        finally:
+            sock.close()
+        raise DaemonException("Daemon exited during command")
+
+    @classmethod
+    def stop(cls, path=DEFAULT_PATH):
+        """Ask daemon on path to exit. Returns False if none was running."""
+        sock = cls._connect(path)
+        if sock is None:
+            return False
+        try:
+            sock.sendall(json.dumps({"stop" : True}) + "\n")
+            sock.makefile("rb").readline()
+        finally:
+            sock.close()
+        return True
@@ -0,0 +1,22 @@
+"""Calendar event"""
+
+class Event(object):
+    """Calendar event as listed in the diary"""
+
+    def __init__(self, title, location, time,
+                 url=None, phone=None, note=None):
+        self.title = title
+        self.location = location
+        self.time = time
+        self.url = url
+        self.phone = phone
+        self.note = note
+
+    def __str__(self):
+        s = "\"{}\"".format(self.title)
+        s += " time: " + self.time
+        s += " location:" + self.location
+        s += " url:" + self.url if self.url else ""
+        s += " phone:" + self.phone if self.phone else ""
+        s += " note:" + self.note if self.note else ""
+        return s
@@ -0,0 +1,84 @@
+"""Cache of events by source and day"""
+
+import hashlib
+import os.path
+import threading
+import time
+
+import PickleStore
+
+class EventCache(PickleStore.Shared):
+    """Events from an EventSource, cached per source key and day.
+
+    Results are kept in memory, so several users in one process (e.g.
+    diary plugins) share one fetch and parse, and optionally as pickles
+    under a directory so repeat runs share them too. Entries older than
+    max_age seconds are fetched again."""
+
+    DEFAULT_PATH = "~/.evernote/cache/events"
+
+    def __init__(self, path=None, max_age=300):
+        """path is the directory to persist results in, None for memory only."""
+        self.path = os.path.expanduser(path) if path else None
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # (key, day) -> (time fetched, list of Events)
+        self._entries = {}
+
+    def events(self, source, day):
+        """Return list of Events from source on day, fetching if needed.
+
+        Exceptions from the source are passed on and nothing is cached."""
+        return self.events_for_days(source, [day])[day]
+
+    def events_for_days(self, source, days):
+        """Return dictionary of lists of Events from source for each
+        of days, fetching the days not cached with a single read.
+
+        Exceptions from the source are passed on and nothing is cached."""
+        events = {}
+        missing = []
+        with self._lock:
+            for day in days:
+                key = (source.key(), day)
+                entry = self._entries.get(key)
+                if entry is None or not self._fresh(entry[0]):
+                    entry = self._load(key)
+                if entry is None or not self._fresh(entry[0]):
+                    missing.append(day)
+                    continue
+                self._entries[key] = entry
+                events[day] = list(entry[1])
+            if missing:
+                if len(missing) == 1:
+                    fetched = {missing[0] : source.events(missing[0])}
+                else:
+                    fetched = source.events_for_days(missing)
+                fetched_at = time.time()
+                for day in missing:
+                    key = (source.key(), day)
+                    entry = (fetched_at, fetched.get(day, []))
+                    self._save(key, entry)
+                    self._entries[key] = entry
+                    events[day] = list(entry[1])
+        return events
+
+    def _fresh(self, fetched):
+        return time.time() - fetched < self.max_age
+
+    def _file(self, key):
+        source_key, day = key
+        digest = hashlib.sha1(source_key).hexdigest()[:16]
+        return os.path.join(self.path,
+                            "{}-{}.pickle".format(digest, day.isoformat()))
+
+    def _load(self, key):
+        """Return (time fetched, events) persisted for key, or None."""
+        if not self.path:
+            return None
+        return PickleStore.load(self._file(key))
+
+    def _save(self, key, entry):
+        if not self.path:
+            return
+        PickleStore.save(self._file(key), entry)
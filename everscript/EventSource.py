@@ -0,0 +1,352 @@
+"""Sources of calendar events"""
+
+import abc
+import calendar
+import datetime
+import glob
+import os.path
+import re
+import subprocess
+
+from Event import Event
+
+# Tags in event notes giving extra details
+URL_REGEX = re.compile(r"@url: (\S+)$")
+PHONE_REGEX = re.compile(r"@phone: (.+)$")
+NOTE_REGEX = re.compile(r"@note: (.+)$")
+
+def parse_tags(lines):
+    """Return (url, phone, note) from tags in lines of event notes.
+
+    The first occurrence of each tag is used; missing tags are None."""
+    url = phone = note = None
+    for line in lines:
+        if "@" not in line:
+            continue
+        if url is None:
+            match = URL_REGEX.search(line)
+            url = match.group(1) if match else None
+        if phone is None:
+            match = PHONE_REGEX.search(line)
+            phone = match.group(1) if match else None
+        if note is None:
+            match = NOTE_REGEX.search(line)
+            note = match.group(1) if match else None
+    return url, phone, note
+
+class EventSource(object):
+    """Source of calendar events for a day"""
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def key(self):
+        """Return string identifying this source and its settings.
+
+        Sources with the same key give the same events, so their
+        results may be shared by EventCache."""
+        return
+
+    @abc.abstractmethod
+    def events(self, day):
+        """Return list of Events on day (a datetime.date)."""
+        return
+
+    def events_for_days(self, days):
+        """Return dictionary of lists of Events for each of days.
+
+        Sources able to read several days at once override this to
+        do so in a single read."""
+        return dict((day, self.events(day)) for day in days)
+
+    @classmethod
+    def from_config(cls, calendars=None, ics_path=None, logger=None):
+        """Return source for the given iCal configuration.
+
+        Reads .ics files from ics_path if given, else runs icalBuddy."""
+        if ics_path:
+            return ICSSource(ics_path)
+        return IcalBuddySource(calendars=calendars, logger=logger)
+
+######################################################################
+
+class IcalBuddySource(EventSource):
+    """Events listed by the icalBuddy command, which must be in PATH.
+
+    Raises OSError if icalBuddy cannot be run."""
+
+    EVENT_SPLIT_REGEX = re.compile(r"^\* ", re.M)
+
+    # Heading of each day's events with -sd, -nrd and -df DATE_FORMAT
+    DATE_FORMAT = "%Y-%m-%d"
+    DATE_HEADING_REGEX = re.compile(r"^(\d{4})-(\d\d)-(\d\d):$", re.M)
+
+    TIME_REGEX = re.compile(r"(\d+:\d+ .M - \d+:\d+ .M)")
+
+    # Fields to display, in order
+    FIELDS = "title,datetime,location,notes"
+
+    def __init__(self, calendars=None, command="icalBuddy", logger=None):
+        """calendars is a comma-separated list of calendars to include."""
+        self.calendars = calendars
+        self.command = command
+        self.logger = logger
+
+    def _debug(self, msg):
+        if self.logger:
+            self.logger.debug(msg)
+
+    def key(self):
+        return "icalBuddy:{}".format(self.calendars or "")
+
+    def _command(self):
+        """Return icalBuddy command line, without the events wanted."""
+        cmd = [self.command]
+        cmd.extend(["-b", "* "])  # Event prefix
+        cmd.extend(["-nc"])  # No calendar titles
+        cmd.extend(["-iep", self.FIELDS])
+        cmd.extend(["-po", self.FIELDS])
+        if self.calendars:
+            self._debug("Filtering on calendars: " + self.calendars)
+            cmd.extend(["-ic", self.calendars])
+        return cmd
+
+    def _run(self, cmd):
+        self._debug("Executing: " + " ".join(cmd))
+        out = subprocess.check_output(cmd)
+        self._debug("Raw icalBuddy output:\n" + out)
+        return out
+
+    def events(self, day):
+        cmd = self._command()
+        if day == datetime.date.today():
+            cmd.append("eventsToday")
+        else:
+            cmd.extend(["eventsFrom:" + day.isoformat(),
+                        "to:" + day.isoformat()])
+        return self.parse(self._run(cmd))
+
+    def events_for_days(self, days):
+        """Run icalBuddy once for the span of days, with events
+        separated by date."""
+        events = dict((day, []) for day in days)
+        if not events:
+            return events
+        cmd = self._command()
+        # Headings for each day, as absolute dates
+        cmd.extend(["-sd", "-nrd", "-df", self.DATE_FORMAT])
+        cmd.extend(["eventsFrom:" + min(days).isoformat(),
+                    "to:" + max(days).isoformat()])
+        events.update(self.parse_days(self._run(cmd), events))
+        return events
+
+    @classmethod
+    def parse_days(cls, output, days=None):
+        """Return dictionary of lists of Events by day from icalBuddy
+        output separated by date (see events_for_days()).
+
+        Only days in days are parsed, if given."""
+        parts = cls.DATE_HEADING_REGEX.split(output)
+        events = {}
+        # parts is text before the first heading, then year, month,
+        # day and events for each heading
+        for i in xrange(1, len(parts) - 3, 4):
+            day = datetime.date(*[int(n) for n in parts[i:i + 3]])
+            if days is not None and day not in days:
+                continue
+            # Drop the rule under the heading
+            section = parts[i + 3]
+            start = section.find("* ")
+            events[day] = cls.parse(section[start:]) if start >= 0 else []
+        return events
+
+    @classmethod
+    def parse(cls, output):
+        """Return list of Events from icalBuddy output.
+
+        Each event is read in a single pass over its lines."""
+        events = []
+        for raw_event in cls.EVENT_SPLIT_REGEX.split(output):
+            if not raw_event.strip():
+                continue
+            lines = raw_event.split("\n")
+            time = location = None
+            notes = None
+            for line in lines:
+                if time is None:
+                    match = cls.TIME_REGEX.search(line)
+                    if match:
+                        time = match.group(1)
+                if location is None:
+                    index = line.find("location: ")
+                    if index >= 0:
+                        location = line[index + len("location: "):]
+                if notes is None:
+                    index = line.find("notes: ")
+                    if index >= 0:
+                        notes = [line[index + len("notes: "):]]
+                else:
+                    notes.append(line)
+            url, phone, note = parse_tags(notes or [])
+            events.append(Event(lines[0], location or "", time or "",
+                                url=url, phone=phone, note=note))
+        return events
+
+######################################################################
+
+class ICSSource(EventSource):
+    """Events read from an .ics file, or all .ics files in a directory.
+
+    Files are read a line at a time rather than loaded whole. Recurring
+    events are only listed on the day they start."""
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+
+    def key(self):
+        return "ics:{}".format(self.path)
+
+    def _files(self):
+        if os.path.isdir(self.path):
+            return sorted(glob.glob(os.path.join(self.path, "*.ics")))
+        return [self.path]
+
+    def events(self, day):
+        return self.events_for_days([day])[day]
+
+    def events_for_days(self, days):
+        """Read the files once for all of days."""
+        events = dict((day, []) for day in days)
+        for path in self._files():
+            with open(path) as f:
+                for properties in self._iter_vevents(f):
+                    day = self._start_day(properties)
+                    if day in events:
+                        event = self._make_event(properties, day)
+                        if event:
+                            events[day].append(event)
+        return events
+
+    @classmethod
+    def _iter_lines(cls, f):
+        """Yield content lines of f, with folded lines joined."""
+        current = None
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line[:1] in (" ", "\t"):
+                if current is not None:
+                    current += line[1:]
+                continue
+            if current is not None:
+                yield current
+            current = line
+        if current is not None:
+            yield current
+
+    @classmethod
+    def _iter_vevents(cls, f):
+        """Yield dictionary of properties for each VEVENT in f.
+
+        Keys are property names, values are (parameters, value)."""
+        properties = None
+        depth = 0
+        for line in cls._iter_lines(f):
+            if line == "BEGIN:VEVENT":
+                properties = {}
+                depth = 0
+            elif properties is None:
+                continue
+            elif line.startswith("BEGIN:"):
+                # Nested component, e.g. VALARM
+                depth += 1
+            elif line.startswith("END:"):
+                if depth:
+                    depth -= 1
+                elif line == "END:VEVENT":
+                    yield properties
+                    properties = None
+            elif depth == 0:
+                name, sep, value = line.partition(":")
+                if not sep:
+                    continue
+                name, sep, parameters = name.partition(";")
+                properties.setdefault(name.upper(), (parameters, value))
+
+    @classmethod
+    def _parse_datetime(cls, parameters, value):
+        """Return (datetime.date or datetime.datetime, is all day)."""
+        if "VALUE=DATE" in parameters.upper().split(";") or len(value) == 8:
+            return datetime.datetime.strptime(value[:8], "%Y%m%d").date(), True
+        dt = datetime.datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+        if value.endswith("Z"):
+            # UTC, convert to local time
+            dt = datetime.datetime.fromtimestamp(
+                calendar.timegm(dt.timetuple()))
+        return dt, False
+
+    @classmethod
+    def _unescape(cls, text):
+        return (text.replace("\\n", "\n").replace("\\N", "\n")
+                .replace("\\,", ",").replace("\\;", ";")
+                .replace("\\\\", "\\"))
+
+    @classmethod
+    def _format_time(cls, dt):
+        """Format time like icalBuddy, e.g. 9:05 AM"""
+        return dt.strftime("%I:%M %p").lstrip("0")
+
+    @classmethod
+    def _start_day(cls, properties):
+        """Return day VEVENT properties start on, or None."""
+        if "DTSTART" not in properties:
+            return None
+        try:
+            start, all_day = cls._parse_datetime(*properties["DTSTART"])
+        except ValueError:
+            return None
+        return start if all_day else start.date()
+
+    @classmethod
+    def _make_event(cls, properties, day):
+        """Return Event for VEVENT properties if it is on day, else None."""
+        if "DTSTART" not in properties:
+            return None
+        try:
+            start, all_day = cls._parse_datetime(*properties["DTSTART"])
+            end = None
+            if "DTEND" in properties:
+                end, end_all_day = cls._parse_datetime(*properties["DTEND"])
+        except ValueError:
+            return None
+        start_day = start if all_day else start.date()
+        if start_day != day:
+            return None
+        if all_day or not isinstance(end, datetime.datetime):
+            time = ""
+        else:
+            time = "{} - {}".format(cls._format_time(start),
+                                    cls._format_time(end))
+        title = cls._unescape(properties.get("SUMMARY", ("", ""))[1])
+        location = cls._unescape(properties.get("LOCATION", ("", ""))[1])
+        description = cls._unescape(properties.get("DESCRIPTION", ("", ""))[1])
+        url, phone, note = parse_tags(description.split("\n"))
+        if url is None and "URL" in properties:
+            url = properties["URL"][1]
+        return Event(title, location, time, url=url, phone=phone, note=note)
+
+######################################################################
+
+class FakeSource(EventSource):
+    """Fixed events, for testing and benchmarking."""
+
+    def __init__(self, events, name="fake"):
+        """events is a list of Events, or a dictionary of lists by day."""
+        self._events = events
+        self.name = name
+
+    def key(self):
+        return "fake:{}".format(self.name)
+
+    def events(self, day):
+        if isinstance(self._events, dict):
+            return list(self._events.get(day, []))
+        return list(self._events)
@@ -1,33 +1,54 @@
 """EverNote class"""
 
-import appscript
-from contextlib import contextmanager
-
+from AppPool import AppPool
+from AppscriptBackend import AppscriptBackend
+from EverNoteException import EverNoteException
 from Note import Note
 from Notes import Notes
 
 class EverNote(object):
 
+    # Backend all class methods talk to
+    backend = AppscriptBackend()
+
+    # NoteCache serving find_notes() results, or None for no caching
+    cache = None
+
+    # NoteIndex answering find_note_by_title(), or None to search the app
+    index = None
+
     def __init__(self, app_name="EverNote"):
-        self.app = self.__get_app(app_name)
+        self.app = AppPool.get(app_name)
+
+    @classmethod
+    def set_cache(cls, cache):
+        """Serve find_notes() from the given NoteCache (None to disable)."""
+        EverNote.cache = cache
+
+    @classmethod
+    def set_index(cls, index):
+        """Answer title lookups from the given NoteIndex (None to disable)."""
+        EverNote.index = index
 
     @classmethod
-    def __get_app(cls, app_name="EverNote"):
-        return appscript.app(app_name)
+    def set_backend(cls, backend):
+        """Send all calls to the given Backend."""
+        EverNote.backend = backend
 
     @classmethod
     def create_note(cls, with_html=None, with_text=None, title="", notebook=None):
-        """Create a note"""
-        kwargs={
-            "title":title,
-            "notebook":notebook,
-            }
-        if with_html is not None:
-            kwargs["with_html"] = with_html
-        if with_text is not None:
-            kwargs["with_text"] = with_text
-        with AppCallContextManager():
-            note = cls.__get_app().create_note(**kwargs)
+        """Create a note
+
+        Cached searches of notebook (of every notebook if None, the
+        default notebook) are dropped, and its index synced on next
+        use, so they find the new note."""
+        note = cls.backend.create_note(title, notebook=notebook,
+                                       with_html=with_html,
+                                       with_text=with_text)
+        if cls.cache is not None:
+            cls.cache.invalidate(notebook)
+        if cls.index is not None:
+            cls.index.invalidate(notebook)
         return Note(note)
 
     @classmethod
@@ -35,29 +56,108 @@ class EverNote(object):
         """Find notes matching search_term. Returns Notes object.
 
         If notebook is not None, scope search to notebook.
+        If a cache has been set with set_cache() and holds fresh
+        results for this search, they are returned without a search.
         """
-        search_term="\"" + search_term + "\""
+        if cls.cache is not None:
+            notes = cls.cache.lookup(search_term, notebook)
+            if notes is not None:
+                return notes
+            # Taken before searching so changes made during the search
+            # make the cached results stale
+            stamp = cls.notebook_stamp(notebook) if notebook else None
+        query="\"" + search_term + "\""
         if notebook:
-            search_term += " notebook:\"{}\"".format(notebook)
-        with AppCallContextManager():
-            notes = cls.__get_app().find_notes(search_term)
-        return Notes(notes)
+            query += " notebook:\"{}\"".format(notebook)
+        notes = Notes(cls.backend.find_notes(query))
+        if cls.cache is not None:
+            cls.cache.store(search_term, notebook, notes, stamp)
+        return notes
 
     @classmethod
     def find_note_by_title(cls, title, notebook=None):
         """Find note with given title. Returns Note object.
 
-        If notebook is not None, scope search to given notebook."""
+        If notebook is not None, scope search to given notebook.
+        A note whose title matches exactly is preferred over one whose
+        title only contains title. If an index has been set with
+        set_index(), notebook's notes are looked up in it instead of
+        searched, and only an exact match is returned."""
+        if cls.index is not None and notebook:
+            return cls.index.find_note_by_title(title, notebook)
         search_term="intitle:\"" + title + "\""
         if notebook:
             search_term += " notebook:\"{}\"".format(notebook)
-        with AppCallContextManager():
-            notes = cls.__get_app().find_notes(search_term)
-        if notes and len(notes) > 0:
-            note = Note(notes[0])
-        else:
-            note = None
-        return note
+        notes = cls.backend.find_notes(search_term)
+        if not notes:
+            return None
+        if len(notes) > 1:
+            notes = Notes(notes)
+            for note in notes.prefetch("title"):
+                if note.title() == title:
+                    return note
+            return notes[0]
+        return Note(notes[0])
+
+    @classmethod
+    def find_note_by_link(cls, link):
+        """Return app reference for the note with the given note link."""
+        return cls.backend.find_note(link)
+
+    @classmethod
+    def notebook_stamp(cls, notebook):
+        """Return string which changes whenever notebook's notes change.
+
+        Made from the number of notes and the latest modification
+        date, fetched in a single call. The app has no stamp of its
+        own for a notebook, so the call returns the modification date
+        of every note in it: cheap next to a search, but growing with
+        the size of the notebook."""
+        dates = cls.backend.modification_dates(notebook)
+        latest = max(dates).isoformat() if dates else ""
+        return "{}:{}".format(len(dates), latest)
+
+    @classmethod
+    def note_versions(cls, notebook):
+        """Return list of (note link, modification date) for every note
+        in notebook, in notebook order, fetched in bulk."""
+        return cls.backend.note_versions(notebook)
+
+    @classmethod
+    def get_property(cls, references, name):
+        """Return property name for every note reference in references.
+
+        The whole list is fetched with a single call where the backend
+        allows. Values are returned in the same order as references."""
+        if not references:
+            return []
+        return cls.backend.get_properties(references, name)
+
+    @classmethod
+    def count_notes(cls, notebook):
+        """Return number of notes in notebook."""
+        return cls.backend.count_notes(notebook)
+
+    @classmethod
+    def iter_notes(cls, search_term="", notebook=None, page_size=100):
+        """Yield lists of up to page_size notes.
+
+        Lists hold app references or, for search results, Note instances.
+
+        With no search_term, pages through notebook by index so only
+        one page is fetched from the app at a time. Otherwise the
+        search is run and its results are yielded page_size at a time.
+        A notebook listing is also done as a search when a cache is set,
+        so it can be served from the cache."""
+        if search_term or not notebook or cls.cache is not None:
+            notes = cls.find_notes(search_term, notebook=notebook).items
+            for start in range(0, len(notes), page_size):
+                yield notes[start:start + page_size]
+            return
+        count = cls.count_notes(notebook)
+        for start in range(0, count, page_size):
+            yield cls.backend.notebook_notes(notebook, start,
+                                             min(start + page_size, count))
 
     @classmethod
     def get_notes_from_notebook(cls, notebook):
@@ -67,36 +167,8 @@ class EverNote(object):
     @classmethod
     def open_collection_window(cls, query_string=None):
         """Open a collection window"""
-        # TODO: handle other arguments besides query_string
-        kwargs={}
-        if query_string:
-            kwargs["with_query_string"] = query_string
-        with AppCallContextManager():
-            window = cls.__get_app().open_collection_window(**kwargs)
-        return window
+        return cls.backend.open_collection_window(query_string)
 
     @classmethod
     def open_note_window(cls, note):
-        with AppCallContextManager():
-            window = cls.__get_app().open_note_window(with_=note.note)
-        return window
-
-class EverNoteException(Exception):
-    def __init__(self, message, detailed_message):
-        self.message = message
-        self.detailed_message = detailed_message
-
-    def __str__(self):
-        return self.message
-
-class AppCallContextManager:
-    """Context manager for calls to appscript app"""
-    def __enter__(self):
-        return self
-
-    def __exit__(self, type, value, tb):
-        if type == appscript.reference.CommandError:
-            raise EverNoteException(value.errormessage,
-                                    str(value))
-
-        
+        return cls.backend.open_note_window(note.note)
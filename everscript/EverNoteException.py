@@ -0,0 +1,23 @@
+"""Exception raised for errors talking to EverNote"""
+
+class EverNoteException(Exception):
+
+    # Apple Event error numbers for failures which may not happen if
+    # the call is tried again:
+    #   -1712: event timed out, e.g. the app was busy
+    #   -600: application isn't running
+    #   -609: connection is invalid
+    TRANSIENT_ERRORS = (-1712, -600, -609)
+
+    def __init__(self, message, detailed_message, number=None):
+        self.message = message
+        self.detailed_message = detailed_message
+        # Apple Event error number, or None
+        self.number = number
+
+    def is_transient(self):
+        """Return True if the call may succeed if tried again."""
+        return self.number in self.TRANSIENT_ERRORS
+
+    def __str__(self):
+        return self.message
@@ -0,0 +1,67 @@
+"""HTML rendering for lists of todos and events"""
+
+import cgi
+
+class HTMLRenderer(object):
+    """Builds diary HTML into a list of chunks joined once at the end.
+
+    Each builder method appends to the buffer and returns self, so
+    calls can be chained. The iter_* class methods yield the same
+    chunks from a generator, for writing straight to a stream."""
+
+    def __init__(self, on_error=None):
+        """on_error, if given, is called as on_error(todo, exception)
+        when a todo cannot be rendered; the todo is then skipped."""
+        self.chunks = []
+        self.on_error = on_error
+
+    def write(self, html):
+        """Append raw HTML."""
+        self.chunks.append(html)
+        return self
+
+    def section(self, heading):
+        """Append a bold section heading."""
+        self.chunks.append("<b>{}</b>\n".format(heading))
+        return self
+
+    def todo_list(self, todos):
+        """Append an unordered list of todo titles."""
+        self.chunks.extend(self.iter_todo_list(todos, self.on_error))
+        return self
+
+    def event_list(self, events):
+        """Append an unordered list of events with their details."""
+        self.chunks.extend(self.iter_event_list(events))
+        return self
+
+    def getvalue(self):
+        """Return all HTML appended so far."""
+        return "".join(self.chunks)
+
+    @classmethod
+    def iter_todo_list(cls, todos, on_error=None):
+        """Yield HTML chunks for an unordered list of todo titles."""
+        yield "<ul>\n"
+        for todo in todos:
+            try:
+                yield "<li>{}</li>\n".format(cgi.escape(todo.title()))
+            except Exception as e:
+                if on_error:
+                    on_error(todo, e)
+        yield "</ul>\n"
+
+    @classmethod
+    def iter_event_list(cls, events):
+        """Yield HTML chunks for an unordered list of events."""
+        escape = cgi.escape
+        yield "<ul>\n"
+        for event in events:
+            yield "<li>{} {}<ul>".format(escape(event.time),
+                                         escape(event.title))
+            for detail in (event.location, event.url,
+                           event.phone, event.note):
+                if detail:
+                    yield "<li>{}</li>".format(escape(detail))
+            yield "</ul></li>\n"
+        yield "</ul>\n"
@@ -0,0 +1,81 @@
+"""Backend adding simulated round-trip latency to another backend"""
+
+import random
+import time
+
+from Backend import Backend
+from EverNoteException import EverNoteException
+
+class LatencyBackend(Backend):
+    """Wraps a backend, sleeping before every call.
+
+    Each call costs latency seconds, plus per_item seconds for every
+    reference or value passed or returned in bulk, approximating the
+    cost of Apple Events to a real application. A failure_rate
+    fraction of calls raise a transient EverNoteException, as if the
+    event had timed out."""
+
+    def __init__(self, backend, latency=0.005, per_item=0.0,
+                 failure_rate=0.0):
+        self.backend = backend
+        self.latency = latency
+        self.per_item = per_item
+        self.failure_rate = failure_rate
+
+    def _delay(self, items=0):
+        time.sleep(self.latency + self.per_item * items)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise EverNoteException("Simulated timeout",
+                                    "Apple event timed out (simulated)",
+                                    number=-1712)
+
+    def create_note(self, title, notebook=None, with_html=None,
+                    with_text=None):
+        self._delay()
+        return self.backend.create_note(title, notebook=notebook,
+                                        with_html=with_html,
+                                        with_text=with_text)
+
+    def find_notes(self, query):
+        notes = self.backend.find_notes(query)
+        self._delay(len(notes))
+        return notes
+
+    def find_note(self, link):
+        self._delay()
+        return self.backend.find_note(link)
+
+    def get(self, reference, name):
+        self._delay()
+        return self.backend.get(reference, name)
+
+    def get_properties(self, references, name):
+        self._delay(len(references))
+        return self.backend.get_properties(references, name)
+
+    def count_notes(self, notebook):
+        self._delay()
+        return self.backend.count_notes(notebook)
+
+    def notebook_notes(self, notebook, start, end):
+        notes = self.backend.notebook_notes(notebook, start, end)
+        self._delay(len(notes))
+        return notes
+
+    def modification_dates(self, notebook):
+        dates = self.backend.modification_dates(notebook)
+        self._delay(len(dates))
+        return dates
+
+    def note_versions(self, notebook):
+        versions = self.backend.note_versions(notebook)
+        self._delay(len(versions))
+        return versions
+
+    def open_collection_window(self, query_string=None):
+        self._delay()
+        return self.backend.open_collection_window(query_string)
+
+    def open_note_window(self, reference):
+        self._delay()
+        return self.backend.open_note_window(reference)
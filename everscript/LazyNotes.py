@@ -0,0 +1,104 @@
+"""List of notes fetched from the app a page at a time"""
+
+import itertools
+
+from Notes import Notes
+
+class LazyNotes(Notes):
+    """Notes read from the app page by page while iterating.
+
+    Iterating yields notes as each page arrives, without holding the
+    whole collection in memory. Anything needing the full list (indexing,
+    slicing, prefetch(), append()) reads every page first and keeps the
+    result."""
+
+    # Notes read by iterating over the whole collection, or None if not
+    # read yet
+    _items = None
+
+    _pages = None
+    _count = None
+    _prefetch = ()
+
+    def __init__(self, pages, count=None, prefetch=("title",)):
+        """pages is a callable returning an iterable of lists of notes.
+
+        Each list may hold app references or Note instances. count,
+        if given, is a callable returning the number of notes without
+        reading them. prefetch lists properties fetched for each page
+        as it is read."""
+        self._pages = pages
+        self._count = count
+        self._prefetch = prefetch
+
+    @classmethod
+    def _from_pages(cls, pages, count=None, prefetch=()):
+        """Return a new instance reading the given pages.
+
+        Bypasses __init__, like Notes._from_items()."""
+        notes = cls.__new__(cls)
+        LazyNotes.__init__(notes, pages, count, prefetch)
+        return notes
+
+    @property
+    def items(self):
+        """List of all notes, read from the app on first use."""
+        if self._items is None:
+            self._items = list(itertools.chain.from_iterable(
+                    self._iter_pages()))
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        self._items = items
+
+    def _iter_pages(self):
+        """Yield each page as a list of _item_class instances."""
+        if self._items is not None:
+            yield self._items
+            return
+        for page in self._pages():
+            notes = Notes._from_items(self._wrap(note) for note in page)
+            notes.prefetch(*self._prefetch)
+            yield notes.items
+
+    def is_read(self):
+        """Return True if all notes have been read from the app."""
+        return self._items is not None
+
+    def __len__(self):
+        """Return number of notes.
+
+        Uses count if given; otherwise every note is read first."""
+        if self._items is None and self._count is not None:
+            return self._count()
+        return len(self.items)
+
+    def __nonzero__(self):
+        """Return True if there are any notes.
+
+        Reads pages only until the first note is found, normally just
+        the first page, unless all notes are already read."""
+        if self._items is not None:
+            return bool(self._items)
+        if self._count is not None:
+            return self._count() > 0
+        for page in self._iter_pages():
+            if page:
+                return True
+        return False
+
+    def __iter__(self):
+        if self._items is not None:
+            return iter(self._items)
+        return itertools.chain.from_iterable(self._iter_pages())
+
+    def filter(self, filter_function):
+        """Return lazy subset of notes that evaluate to True with filter_function.
+
+        Notes are tested as they are read, so the first match is
+        available before the whole collection has been fetched."""
+        def pages():
+            for page in self._iter_pages():
+                yield [note for note in page if filter_function(note)]
+        return self._from_pages(pages)
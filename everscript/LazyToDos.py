@@ -0,0 +1,66 @@
+"""Collection of ToDo notes fetched a page at a time"""
+
+import datetime
+
+from . import EverNote, LazyNotes, ToDos
+
+class LazyToDos(LazyNotes, ToDos):
+    """ToDos read from the app page by page while iterating.
+
+    Filters such as past_due() return LazyToDos too, so matching todos
+    can be used before the whole notebook has been fetched. They test
+    each todo as it is read rather than using a ToDoTable, which would
+    need every todo first."""
+
+    def __init__(self, notebook=None, search_term="", page_size=100):
+        self.notebook = notebook
+        if notebook:
+            pages = lambda: EverNote.iter_notes(search_term,
+                                                notebook=notebook,
+                                                page_size=page_size)
+            if search_term:
+                count = None
+            else:
+                count = lambda: EverNote.count_notes(notebook)
+        else:
+            pages = lambda: iter([])
+            count = lambda: 0
+        LazyNotes.__init__(self, pages, count)
+
+    def due_today(self):
+        """Return lazy subset of todos due today."""
+        today = datetime.date.today()
+        return self.filter(lambda t: t.due_today(today))
+
+    def past_due(self):
+        """Return lazy subset of todos due prior to today."""
+        today = datetime.date.today()
+        return self.filter(lambda t: t.past_due(today))
+
+    def due_asap(self):
+        """Return lazy subset of todos due ASAP."""
+        return self.filter(lambda t: t.due_asap())
+
+    def without_due_date(self):
+        """Return lazy subset of todos without due date."""
+        return self.filter(lambda t: t.due_date() is None)
+
+    def due_soon(self, soon_days=7):
+        """Return lazy subset of todos due in next soon_days days."""
+        today = datetime.date.today()
+        return self.filter(lambda t: t.due_soon(soon_days, today))
+
+    def due_later(self, later_days=8):
+        """Return lazy subset of todos due later_days or more from today."""
+        today = datetime.date.today()
+        return self.filter(lambda t: t.due_later(later_days, today))
+
+    def due_between(self, start, end):
+        """Return lazy subset of todos due on or after date start and
+        before date end."""
+        def due_between(todo):
+            due_date = todo.due_date()
+            return (due_date is not None and
+                    (start is None or due_date >= start) and
+                    (end is None or due_date < end))
+        return self.filter(due_between)
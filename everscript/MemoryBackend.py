@@ -0,0 +1,163 @@
+"""Backend keeping notes in memory"""
+
+import datetime
+import random
+import re
+
+from Backend import Backend
+from EverNoteException import EverNoteException
+
+class MemoryNote(object):
+    """A note held by MemoryBackend. Also serves as its reference."""
+
+    __slots__ = ("title", "HTML_content", "notebook", "note_link",
+                 "modification_date")
+
+    def __init__(self, title, notebook, HTML_content, note_link,
+                 modification_date):
+        self.title = title
+        self.notebook = notebook
+        self.HTML_content = HTML_content
+        self.note_link = note_link
+        self.modification_date = modification_date
+
+class MemoryBackend(Backend):
+    """Notes held in memory, for testing and benchmarking off a Mac.
+
+    Understands the subset of EverNote search grammar EverNote builds:
+    a quoted phrase (matched case-insensitively against title and
+    content), intitle:"phrase" and notebook:"name"."""
+
+    QUERY_REGEX = re.compile(r'(?:(\w+):)?"([^"]*)"')
+
+    def __init__(self):
+        self.notes = []
+        # Notes in each notebook, in creation order
+        self.notebooks = {}
+        self.links = {}
+        # Number of notes ever added, so links are never reused
+        self._added = 0
+
+    def add_note(self, title, notebook=None, html="",
+                 modification_date=None):
+        """Add a note, returning it."""
+        note = MemoryNote(title, notebook, html,
+                          "memory:///{}".format(self._added),
+                          modification_date or datetime.datetime.now())
+        self._added += 1
+        self.notes.append(note)
+        self.notebooks.setdefault(notebook, []).append(note)
+        self.links[note.note_link] = note
+        return note
+
+    def update_note(self, note, title=None, html=None):
+        """Change a note's title and/or content, updating its
+        modification date. Returns the note."""
+        if title is not None:
+            note.title = title
+        if html is not None:
+            note.HTML_content = html
+        note.modification_date = datetime.datetime.now()
+        return note
+
+    def delete_note(self, note):
+        """Remove a note."""
+        self.notes.remove(note)
+        self.notebooks[note.notebook].remove(note)
+        del self.links[note.note_link]
+
+    def seed(self, count, notebook="Next Action", today=None,
+             due_fraction=0.75, asap_fraction=0.05, days=30, seed=0):
+        """Add count synthetic todos to notebook.
+
+        due_fraction of them get a due date within days either side
+        of today, and asap_fraction are marked ASAP. Returns self."""
+        rng = random.Random(seed)
+        today = today or datetime.date.today()
+        modified = datetime.datetime.now()
+        for i in xrange(count):
+            title = "Synthetic todo {}".format(i)
+            if rng.random() < due_fraction:
+                due = today + datetime.timedelta(rng.randint(-days, days))
+                title += " due:{}/{}/{}".format(due.month, due.day, due.year)
+            if rng.random() < asap_fraction:
+                title += " ASAP"
+            self.add_note(title, notebook, modification_date=modified)
+        return self
+
+    def _note(self, reference):
+        if not isinstance(reference, MemoryNote):
+            raise EverNoteException("Not a note reference",
+                                    repr(reference))
+        return reference
+
+    def create_note(self, title, notebook=None, with_html=None,
+                    with_text=None):
+        html = with_html if with_html is not None else (with_text or "")
+        return self.add_note(title, notebook, html)
+
+    def find_notes(self, query):
+        notebook = None
+        phrases = []
+        titles = []
+        for field, phrase in self.QUERY_REGEX.findall(query):
+            if field == "notebook":
+                notebook = phrase
+            elif field == "intitle":
+                titles.append(phrase.lower())
+            elif field == "":
+                phrases.append(phrase.lower())
+            else:
+                raise EverNoteException("Unsupported search field",
+                                        "{} in {}".format(field, query))
+        if notebook is None:
+            notes = self.notes
+        else:
+            notes = self.notebooks.get(notebook, [])
+        phrases = [p for p in phrases if p]
+        if not phrases and not titles:
+            return list(notes)
+        matches = []
+        for note in notes:
+            title = note.title.lower()
+            if not all(t in title for t in titles):
+                continue
+            if not all(p in title or p in note.HTML_content.lower()
+                       for p in phrases):
+                continue
+            matches.append(note)
+        return matches
+
+    def find_note(self, link):
+        try:
+            return self.links[link]
+        except KeyError:
+            raise EverNoteException("No such note", link)
+
+    def get(self, reference, name):
+        return getattr(self._note(reference), name)
+
+    def get_properties(self, references, name):
+        return [getattr(self._note(reference), name)
+                for reference in references]
+
+    def count_notes(self, notebook):
+        return len(self.notebooks.get(notebook, []))
+
+    def notebook_notes(self, notebook, start, end):
+        return self.notebooks.get(notebook, [])[start:end]
+
+    def modification_dates(self, notebook):
+        return [note.modification_date
+                for note in self.notebooks.get(notebook, [])]
+
+    def note_versions(self, notebook):
+        return [(note.note_link, note.modification_date)
+                for note in self.notebooks.get(notebook, [])]
+
+    def open_collection_window(self, query_string=None):
+        return None
+
+    def open_note_window(self, reference):
+        self._note(reference)
+        return None
@@ -1,13 +1,112 @@
 """Wrapper around a EverNote Note"""
 
+import time
+
 class Note(object):
 
-    def __init__(self, note):
-        self.note = note
+    # Seconds a fetched property value stays valid. None means values
+    # stay cached until invalidate() or refresh() is called.
+    cache_ttl = None
+
+    # Counters for property cache, shared by all notes
+    cache_hits = 0
+    cache_misses = 0
+
+    def __init__(self, note, link=None):
+        """note is an app reference, or None if link is given.
+
+        link is the note's note link, used to look up the reference
+        on first use. Notes served from NoteCache are created this way."""
+        self._note = note
+        self._link = link
+        # Property values already fetched from the app, keyed by name.
+        # Each value is a (value, time fetched) tuple.
+        self._properties = {}
+
+    @property
+    def note(self):
+        """App reference for this note"""
+        if self._note is None and self._link is not None:
+            # Avoid circular import
+            from EverNote import EverNote
+            self._note = EverNote.find_note_by_link(self._link)
+        return self._note
 
     def title(self):
-        return self.note.title.get()
+        return self._get_property("title")
+
+    def link(self):
+        """Return note link, which identifies the note across app restarts"""
+        if self._link is None:
+            self._link = self._get_property("note_link")
+        return self._link
+
+    def modification_date(self):
+        """Return modification date as datetime.datetime"""
+        return self._get_property("modification_date")
 
     def content(self):
         """Return content as HTML"""
-        return self.note.HTML_content.get()
+        return self._get_property("HTML_content")
+
+    def is_cached(self, name):
+        """Return True if property name has been fetched and is still valid."""
+        if name not in self._properties:
+            return False
+        if self.cache_ttl is None:
+            return True
+        value, fetched = self._properties[name]
+        return (time.time() - fetched) < self.cache_ttl
+
+    def set_cached(self, name, value):
+        """Fill the cache for property name with value.
+
+        Used by Notes.prefetch() to store values fetched in bulk."""
+        self._properties[name] = (value, time.time())
+
+    def invalidate(self, name=None):
+        """Drop cached property name, or all cached properties if None."""
+        if name is None:
+            self._properties.clear()
+        else:
+            self._properties.pop(name, None)
+
+    def refresh(self, *names):
+        """Re-fetch the given properties from the app.
+
+        With no arguments, re-fetches every property currently cached."""
+        if not names:
+            names = self._properties.keys()
+        for name in names:
+            self.invalidate(name)
+            self._get_property(name)
+
+    @classmethod
+    def set_cache_ttl(cls, ttl):
+        """Set seconds cached property values stay valid (None for forever)."""
+        Note.cache_ttl = ttl
+
+    @classmethod
+    def cache_stats(cls):
+        """Return dictionary with property cache hit and miss counts."""
+        return {
+            "hits" : Note.cache_hits,
+            "misses" : Note.cache_misses,
+            }
+
+    @classmethod
+    def reset_cache_stats(cls):
+        """Zero property cache hit and miss counts."""
+        Note.cache_hits = 0
+        Note.cache_misses = 0
+
+    def _get_property(self, name):
+        """Return property name, fetching it from the app if not cached."""
+        if self.is_cached(name):
+            Note.cache_hits += 1
+        else:
+            Note.cache_misses += 1
+            # Avoid circular import
+            from EverNote import EverNote
+            self.set_cached(name, EverNote.backend.get(self.note, name))
+        return self._properties[name][0]
@@ -0,0 +1,130 @@
+"""Persistent cache of note search results"""
+
+import datetime
+import os
+import os.path
+import sqlite3
+import threading
+import time
+
+from Note import Note
+from Notes import Notes
+
+class NoteCache(object):
+    """SQLite cache of EverNote.find_notes() results.
+
+    For each search term and notebook, holds the note link, title and
+    modification date of every result, plus a stamp of the notebook
+    (see EverNote.notebook_stamp()) taken when the search was run.
+
+    Results are served only if the notebook's stamp has not changed
+    since they were stored; searches not scoped to a notebook have no
+    stamp and are run again. Taking a stamp costs one call, but it
+    returns the modification date of every note in the notebook, so
+    it grows with the notebook (though far more slowly than searching
+    it). Results younger than max_age seconds (default 0, never) are
+    served without taking a stamp, so may miss changes made in that
+    time. EverNote.create_note() drops results for the notebook it
+    creates a note in."""
+
+    DEFAULT_PATH = "~/.evernote/cache/notes.sqlite"
+
+    SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    search_term TEXT NOT NULL,
+    notebook TEXT NOT NULL,
+    stamp TEXT,
+    checked REAL NOT NULL,
+    PRIMARY KEY (search_term, notebook)
+);
+CREATE TABLE IF NOT EXISTS notes (
+    search_term TEXT NOT NULL,
+    notebook TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    title TEXT,
+    modified REAL
+);
+CREATE INDEX IF NOT EXISTS notes_by_search ON notes (search_term, notebook);
+"""
+
+    def __init__(self, path=DEFAULT_PATH, max_age=0):
+        self.path = os.path.expanduser(path)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(self.SCHEMA)
+
+    def lookup(self, search_term, notebook=None):
+        """Return cached Notes for search, or None if not cached or stale."""
+        # Avoid circular import
+        from EverNote import EverNote
+        key = (search_term, notebook or "")
+        with self._lock:
+            row = self.db.execute(
+                "SELECT stamp, checked FROM searches"
+                " WHERE search_term = ? AND notebook = ?", key).fetchone()
+        if row is None:
+            return None
+        stamp, checked = row
+        if time.time() - checked >= self.max_age:
+            if not notebook or EverNote.notebook_stamp(notebook) != stamp:
+                return None
+            with self._lock, self.db:
+                self.db.execute(
+                    "UPDATE searches SET checked = ?"
+                    " WHERE search_term = ? AND notebook = ?",
+                    (time.time(),) + key)
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT link, title, modified FROM notes"
+                " WHERE search_term = ? AND notebook = ? ORDER BY position",
+                key).fetchall()
+        notes = []
+        for link, title, modified in rows:
+            note = Note(None, link=link)
+            note.set_cached("title", title)
+            if modified is not None:
+                note.set_cached("modification_date",
+                                datetime.datetime.fromtimestamp(modified))
+            notes.append(note)
+        return Notes(notes)
+
+    def store(self, search_term, notebook, notes, stamp=None):
+        """Save notes as the results of search.
+
+        stamp is the notebook stamp taken before the search was run.
+        Fetches links, titles and modification dates for all notes in
+        bulk, so they are cached in the notes too."""
+        notes.prefetch("note_link", "title", "modification_date")
+        key = (search_term, notebook or "")
+        rows = [key + (position, note.link(), note.title(),
+                       time.mktime(note.modification_date().timetuple()))
+                for position, note in enumerate(notes)]
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM notes"
+                            " WHERE search_term = ? AND notebook = ?", key)
+            self.db.executemany("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?)",
+                                rows)
+            self.db.execute("INSERT OR REPLACE INTO searches"
+                            " VALUES (?, ?, ?, ?)",
+                            key + (stamp, time.time()))
+
+    def invalidate(self, notebook=None):
+        """Remove cached results for notebook, or all results if None."""
+        if notebook is None:
+            return self.clear()
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM notes WHERE notebook = ?",
+                            (notebook,))
+            self.db.execute("DELETE FROM searches WHERE notebook = ?",
+                            (notebook,))
+
+    def clear(self):
+        """Remove all cached results."""
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM notes")
+            self.db.execute("DELETE FROM searches")
@@ -0,0 +1,318 @@
+"""Local index of notes, for lookups without searching the app"""
+
+import bisect
+import datetime
+import hashlib
+import os.path
+import re
+import threading
+import time
+
+from NotebookSync import NotebookSync
+import PickleStore
+from Notes import Notes
+from ToDo import ToDo
+from ToDos import ToDos
+
+class NotebookIndex(object):
+    """Index of one notebook's notes, kept current by a NotebookSync.
+
+    Holds an inverted index from the words of each note's title (and
+    content, if content is True) to note links, a map from exact
+    titles to links and a list of (due date ordinal, link) sorted by
+    due date. Each sync re-indexes only the notes which changed.
+
+    M/D due dates are resolved against the current year, so they are
+    parsed again when the index is restored and when the year
+    changes (see check_year())."""
+
+    WORD_REGEX = re.compile(r"\w+", re.UNICODE)
+
+    TAG_REGEX = re.compile(r"<[^>]*>")
+
+    def __init__(self, notebook, content=True):
+        self.notebook = notebook
+        self.content = content
+        self.sync = NotebookSync(notebook)
+        self.sync.add_listener(self.apply)
+        # Time of the last sync, 0 if never synced
+        self.synced = 0
+        # True if changed since state() was last called
+        self.dirty = False
+        # link -> (title, due date ordinal or 0, tuple of words)
+        self._records = {}
+        # word -> set of links
+        self._words = {}
+        # title -> list of links
+        self._titles = {}
+        # (due date ordinal, link), sorted when _due_sorted is True.
+        # Sorting is put off until needed, so indexing a whole
+        # notebook costs one sort rather than an insertion per note.
+        self._due = []
+        self._due_sorted = True
+        # Year due dates were parsed in
+        self._year = datetime.date.today().year
+
+    def refresh(self):
+        """Sync with the notebook, re-indexing changed notes."""
+        self.sync.sync()
+        self.synced = time.time()
+
+    def apply(self, changes):
+        """Update the index from a list of NoteChanges."""
+        notes = [change.note for change in changes if change.note]
+        if self.content and notes:
+            Notes._from_items(notes).prefetch("HTML_content")
+        for change in changes:
+            self._remove(change.link)
+            if change.note:
+                content = ""
+                if self.content:
+                    content = self.TAG_REGEX.sub(" ", change.note.content())
+                self._add(change.link, change.note.title(), content)
+                # The index keeps what it needs; the sync only needs links
+                change.note.invalidate()
+        self.dirty = True
+
+    @classmethod
+    def words(cls, text):
+        """Return set of case folded words in text."""
+        if isinstance(text, str):
+            text = text.decode("utf8", "replace")
+        return frozenset(word.lower() for word in cls.WORD_REGEX.findall(text))
+
+    def _add(self, link, title, content="", words=None):
+        due_date = ToDo.title_due_date(title)
+        due = due_date.toordinal() if due_date else 0
+        if words is None:
+            words = tuple(self.words(title + " " + content))
+        self._records[link] = (title, due, words)
+        for word in words:
+            self._words.setdefault(word, set()).add(link)
+        self._titles.setdefault(title, []).append(link)
+        if due:
+            self._due.append((due, link))
+            self._due_sorted = False
+
+    def _remove(self, link):
+        record = self._records.pop(link, None)
+        if record is None:
+            return
+        title, due, words = record
+        for word in words:
+            links = self._words[word]
+            links.discard(link)
+            if not links:
+                del self._words[word]
+        links = self._titles[title]
+        links.remove(link)
+        if not links:
+            del self._titles[title]
+        if due:
+            self._sort_due()
+            del self._due[bisect.bisect_left(self._due, (due, link))]
+
+    def check_year(self):
+        """Parse due dates again if the year has changed since they
+        were parsed."""
+        year = datetime.date.today().year
+        if year == self._year:
+            return
+        self._year = year
+        self._due = []
+        for link, (title, due, words) in self._records.items():
+            due_date = ToDo.title_due_date(title)
+            due = due_date.toordinal() if due_date else 0
+            self._records[link] = (title, due, words)
+            if due:
+                self._due.append((due, link))
+        self._due_sorted = False
+        self.dirty = True
+
+    def _sort_due(self):
+        if not self._due_sorted:
+            self._due.sort()
+            self._due_sorted = True
+
+    #
+    # Lookups, each returning a list of (link, title)
+
+    def find_title(self, title):
+        """Notes whose title is exactly title."""
+        return [(link, title) for link in self._titles.get(title, ())]
+
+    def search(self, text):
+        """Notes containing every word of text, ordered by title."""
+        words = self.words(text)
+        if not words:
+            return []
+        sets = sorted((self._words.get(word, set()) for word in words),
+                      key=len)
+        links = sets[0].intersection(*sets[1:])
+        return sorted(((link, self._records[link][0]) for link in links),
+                      key=lambda found: found[1])
+
+    def due_between(self, start, end):
+        """Notes due on or after date start and before date end, in
+        order of due date. Either may be None for no bound."""
+        self._sort_due()
+        low = bisect.bisect_left(self._due,
+                                 (start.toordinal(),) if start else (1,))
+        if end:
+            high = bisect.bisect_left(self._due, (end.toordinal(),))
+        else:
+            high = len(self._due)
+        return [(link, self._records[link][0])
+                for due, link in self._due[low:high]]
+
+    #
+    # Persistence
+
+    def state(self):
+        """Return picklable state for from_state()."""
+        links, versions = self.sync.state()
+        self.dirty = False
+        return {
+            "notebook" : self.notebook,
+            "content" : self.content,
+            "links" : links,
+            "versions" : versions,
+            "records" : self._records,
+            }
+
+    @classmethod
+    def from_state(cls, state):
+        """Return index restored from state(). It is synced on first use.
+
+        Due dates are parsed again from titles, rather than taken from
+        state, as M/D dates depend on the year."""
+        index = cls(state["notebook"], state["content"])
+        titles = {}
+        for link, (title, due, words) in state["records"].items():
+            index._add(link, title, words=words)
+            titles[link] = title
+        index.sync.restore(state["links"], state["versions"], titles)
+        return index
+
+class NoteIndex(object):
+    """Local index of notebooks, answering lookups without searching
+    the app.
+
+    Each notebook gets a NotebookIndex the first time it is looked up
+    in. A notebook's index is synced when it is more than max_age
+    seconds old, which costs a call or two plus fetching the notes
+    changed since, and is optionally saved under a directory so later
+    runs start from it rather than reading the whole notebook."""
+
+    DEFAULT_PATH = "~/.evernote/cache/index"
+
+    # Seconds an index is used before syncing it again
+    DEFAULT_MAX_AGE = 60
+
+    # Bump when the saved state changes shape
+    VERSION = 1
+
+    def __init__(self, path=None, max_age=DEFAULT_MAX_AGE, content=True):
+        """path is the directory to persist indexes in, None for memory only.
+
+        content says whether note contents are indexed for search(),
+        as well as titles."""
+        self.path = os.path.expanduser(path) if path else None
+        self.max_age = max_age
+        self.content = content
+        self._lock = threading.Lock()
+        # notebook -> NotebookIndex
+        self._notebooks = {}
+
+    def _index(self, notebook):
+        """Return NotebookIndex for notebook, synced if too old.
+
+        Must be called with self._lock held."""
+        index = self._notebooks.get(notebook)
+        if index is None:
+            index = self._load(notebook) or NotebookIndex(notebook,
+                                                          self.content)
+            self._notebooks[notebook] = index
+        index.check_year()
+        if time.time() - index.synced >= self.max_age:
+            index.refresh()
+            if index.dirty:
+                self._save(index)
+        return index
+
+    def invalidate(self, notebook=None):
+        """Sync notebook's index (every index if None) on its next use,
+        however recently it was synced, e.g. after creating a note."""
+        with self._lock:
+            for name, index in self._notebooks.items():
+                if notebook is None or name == notebook:
+                    index.synced = 0
+
+    def find_note_by_title(self, title, notebook):
+        """Return Note in notebook with exactly the given title, or None.
+
+        The note's modification date, as of the last sync, is cached
+        in it along with its title."""
+        with self._lock:
+            index = self._index(notebook)
+            found = index.find_title(title)[:1]
+            if not found:
+                return None
+            modified = index.sync.version(found[0][0])
+        note = self._notes(Notes, found)[0]
+        note.set_cached("modification_date", modified)
+        return note
+
+    def search(self, text, notebook):
+        """Return Notes in notebook containing every word of text."""
+        with self._lock:
+            found = self._index(notebook).search(text)
+        return self._notes(Notes, found)
+
+    def due_between(self, start, end, notebook):
+        """Return ToDos in notebook due on or after date start and
+        before date end, in order of due date."""
+        with self._lock:
+            found = self._index(notebook).due_between(start, end)
+        return self._notes(ToDos, found)
+
+    @classmethod
+    def _notes(cls, collection_class, found):
+        """Return collection of the (link, title)s in found.
+
+        Notes are looked up by link when anything but their title is
+        needed."""
+        items = []
+        for link, title in found:
+            item = collection_class._item_class(None, link=link)
+            item.set_cached("title", title)
+            items.append(item)
+        return collection_class._from_items(items)
+
+    def _file(self, notebook):
+        name = notebook.encode("utf8") if isinstance(notebook, unicode) \
+            else notebook
+        digest = hashlib.sha1(name).hexdigest()[:16]
+        return os.path.join(self.path, "{}.pickle".format(digest))
+
+    def _load(self, notebook):
+        """Return NotebookIndex saved for notebook, or None."""
+        if not self.path:
+            return None
+        saved = PickleStore.load(self._file(notebook))
+        try:
+            version, state = saved
+            if (version != self.VERSION or state["notebook"] != notebook or
+                state["content"] != self.content):
+                return None
+            return NotebookIndex.from_state(state)
+        except Exception:
+            # Not saved, or saved in another shape: index the notebook
+            # afresh
+            return None
+
+    def _save(self, index):
+        if not self.path:
+            return
+        PickleStore.save(self._file(index.notebook),
+                         (self.VERSION, index.state()))
@@ -0,0 +1,160 @@
+"""Incremental sync of a notebook's notes"""
+
+import threading
+
+from EverNote import EverNote
+from Notes import Notes
+
+class NoteChange(object):
+    """A note added to, modified in or removed from a notebook"""
+
+    ADDED = "added"
+    MODIFIED = "modified"
+    REMOVED = "removed"
+
+    def __init__(self, kind, link, note=None, old_note=None):
+        # One of ADDED, MODIFIED or REMOVED
+        self.kind = kind
+        # Note link of the note
+        self.link = link
+        # Note as it is now, with its title fetched; None if removed
+        self.note = note
+        # Note as of the previous sync; None if added
+        self.old_note = old_note
+
+    def __str__(self):
+        return "{} {}".format(self.kind, self.link)
+
+class NotebookSync(object):
+    """Local copy of a notebook's notes, brought up to date by sync().
+
+    Keeps a snapshot of every note's link and modification date. Each
+    sync() compares it with the notebook, fetched in bulk, and only
+    fetches the notes added or modified since the previous sync, so a
+    refresh costs a few app calls plus work in proportion to the
+    changes rather than the size of the notebook.
+
+    Listeners are called with the list of NoteChanges found by each
+    sync which finds any."""
+
+    # Changed notes up to this many positions apart have their
+    # references fetched in one call, along with the notes between
+    max_gap = 16
+
+    def __init__(self, notebook, collection_class=Notes):
+        """collection_class is the Notes subclass returned by notes(),
+        e.g. ToDos, whose item class is used for the notes."""
+        self.notebook = notebook
+        self.collection_class = collection_class
+        self.listeners = []
+        self._lock = threading.Lock()
+        # Note links in notebook order
+        self._links = []
+        # link -> modification date as of the last sync
+        self._versions = {}
+        # link -> item
+        self._notes = {}
+
+    def add_listener(self, listener):
+        """Call listener(changes) after each sync which finds changes."""
+        self.listeners.append(listener)
+
+    def notes(self):
+        """Return collection of the notes as of the last sync, in
+        notebook order."""
+        with self._lock:
+            return self.collection_class._from_items(
+                [self._notes[link] for link in self._links])
+
+    def version(self, link):
+        """Return modification date of note link as of the last sync,
+        or None if it was not in the notebook."""
+        with self._lock:
+            return self._versions.get(link)
+
+    def state(self):
+        """Return (links, versions) describing the notes as of the last
+        sync, for restore()."""
+        with self._lock:
+            return (list(self._links), dict(self._versions))
+
+    def restore(self, links, versions, titles):
+        """Start from a state saved by state() rather than empty.
+
+        titles maps each link to its note's title. The next sync()
+        fetches only the notes changed since the state was saved."""
+        item_class = self.collection_class._item_class
+        with self._lock:
+            self._links = list(links)
+            self._versions = dict(versions)
+            self._notes = {}
+            for link in self._links:
+                item = item_class(None, link=link)
+                item.set_cached("title", titles[link])
+                item.set_cached("modification_date", versions[link])
+                self._notes[link] = item
+
+    def sync(self):
+        """Bring the local copy up to date. Returns list of NoteChanges."""
+        with self._lock:
+            versions = EverNote.note_versions(self.notebook)
+            changed = []  # (position, link, kind)
+            current = {}
+            for position, (link, modified) in enumerate(versions):
+                current[link] = modified
+                old = self._versions.get(link)
+                if old is None:
+                    changed.append((position, link, NoteChange.ADDED))
+                elif old != modified:
+                    changed.append((position, link, NoteChange.MODIFIED))
+            removed = [link for link in self._links if link not in current]
+            fetched = self._fetch(changed, current) if changed else {}
+            changes = []
+            for position, link, kind in changed:
+                changes.append(NoteChange(kind, link, fetched[link],
+                                          self._notes.get(link)))
+                self._notes[link] = fetched[link]
+            for link in removed:
+                changes.append(NoteChange(NoteChange.REMOVED, link,
+                                          old_note=self._notes.pop(link)))
+            self._links = [link for link, modified in versions]
+            self._versions = current
+            if changes:
+                for listener in self.listeners:
+                    listener(changes)
+        return changes
+
+    def _fetch(self, changed, versions):
+        """Return dictionary of items for changed notes, titles fetched.
+
+        References are fetched a run of nearby positions at a time
+        (see max_gap). The notebook may have changed since its versions were
+        read, so links are checked and any note which has moved is
+        looked up by its link instead."""
+        runs = []  # [start, end] of nearby positions
+        for position, link, kind in changed:
+            if runs and position - runs[-1][1] <= self.max_gap:
+                runs[-1][1] = position + 1
+            else:
+                runs.append([position, position + 1])
+        item_class = self.collection_class._item_class
+        items = []
+        for start, end in runs:
+            references = EverNote.backend.notebook_notes(self.notebook,
+                                                         start, end)
+            items.extend(item_class(reference) for reference in references)
+        notes = self.collection_class._from_items(items)
+        notes.prefetch("note_link")
+        wanted = set(link for position, link, kind in changed)
+        fetched = {}
+        for item in items:
+            if item.link() in wanted:
+                fetched[item.link()] = item
+        for position, link, kind in changed:
+            if link not in fetched:
+                fetched[link] = item_class(None, link=link)
+        notes = self.collection_class._from_items(fetched.values())
+        notes.prefetch("title")
+        for link, item in fetched.items():
+            item.set_cached("modification_date", versions[link])
+        return fetched
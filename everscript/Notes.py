@@ -1,8 +1,7 @@
 """Wrapper around a list of notes"""
 
-from operator import getitem
-
 from Note import Note
+from Query import Query
 
 class Notes(object):
 
@@ -10,30 +9,104 @@ class Notes(object):
     _item_class = Note
 
     def __init__(self, notes):
-        self.notes = notes
+        """notes may be a list of app references or of Note instances."""
+        self.items = [self._wrap(note) for note in notes]
+
+    @classmethod
+    def _from_items(cls, items):
+        """Return a new instance holding the given _item_class instances.
+
+        Bypasses __init__ so subclasses with other constructor
+        signatures (e.g. ToDos) can be built from a list."""
+        notes = cls.__new__(cls)
+        notes.items = list(items)
+        return notes
+
+    @classmethod
+    def _wrap(cls, note):
+        """Return note as an instance of _item_class.
+
+        If note is already a Note, its cached properties are shared
+        with the returned instance."""
+        if isinstance(note, cls._item_class):
+            return note
+        if isinstance(note, Note):
+            item = cls._item_class(note._note, link=note._link)
+            item._properties = note._properties
+            return item
+        return cls._item_class(note)
+
+    @property
+    def notes(self):
+        """List of the underlying app references"""
+        return [item.note for item in self.items]
 
     def __len__(self):
-        return len(self.notes)
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
 
     def __getitem__(self, i):
         if isinstance(i, slice):
-            args = [i.start] if i.start is not None else []
-            args.append(i.stop)
-            if i.step:
-                args.append(i.step)
-            return self.__class__(getitem(self.notes, *args))
+            return self._from_items(self.items[i])
         else:
-            return self._item_class(getitem(self.notes, i))
+            return self.items[i]
 
     def append(self, note):
         """Append a note to list.
 
         note must be a Note instance."""
-        self.notes.append(note.note)
+        self.items.append(self._wrap(note))
 
     def extend(self, notes):
         """Extend a list of notes with another list of notes.
 
         notes must be a Notes instance."""
-        self.notes.extend(notes.notes)
+        self.items.extend(self._wrap(note) for note in notes.items)
+
+    def filter(self, filter_function):
+        """Return subset of notes that evaluate to True with filter_function.
+
+        The result is an instance of the same class as self. Only the
+        matching notes are kept, so subclasses whose items are made
+        on iteration (e.g. ToDos) do not make them all at once."""
+        return self._from_items(note for note in self
+                                if filter_function(note))
+
+    def query(self):
+        """Return a lazy Query matching every note."""
+        return Query(self)
+
+    def where(self, predicate):
+        """Return a lazy Query matching notes for which predicate is true."""
+        return Query(self, predicate)
+
+    def prefetch(self, *properties):
+        """Fetch the given properties for all notes, one app call each.
+
+        Values are stored in each note's cache, so later calls such as
+        title() do not go back to the app. Notes which already have a
+        property cached are not fetched again. Returns self."""
+        # Avoid circular import
+        from EverNote import EverNote
+        for name in properties:
+            missing = [item for item in self.items
+                       if not item.is_cached(name)]
+            if not missing:
+                continue
+            values = EverNote.get_property([item.note for item in missing],
+                                           name)
+            for item, value in zip(missing, values):
+                item.set_cached(name, value)
+        return self
+
+    def titles(self):
+        """Return list of all note titles, fetched in one app call."""
+        self.prefetch("title")
+        return [item.title() for item in self.items]
 
+    def contents(self):
+        """Return list of all note contents as HTML, fetched in one app call."""
+        self.prefetch("HTML_content")
+        return [item.content() for item in self.items]
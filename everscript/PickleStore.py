@@ -0,0 +1,45 @@
+"""Pickles persisted by the caches, safe against concurrent runs"""
+
+import cPickle
+import os
+import os.path
+import threading
+
+def load(path, default=None):
+    """Return object pickled in file path, or default.
+
+    A missing, truncated or stale file, e.g. one pickled before a class
+    was renamed, is treated as not cached."""
+    try:
+        with open(path, "rb") as f:
+            return cPickle.load(f)
+    except Exception:
+        return default
+
+def save(path, obj):
+    """Pickle obj to file path, creating its directory if needed.
+
+    The pickle is written to a temporary file then renamed, so
+    concurrent runs never see a partial file."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp = "{}.{}".format(path, os.getpid())
+    with open(tmp, "wb") as f:
+        cPickle.dump(obj, f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(tmp, path)
+
+class Shared(object):
+    """Mixin giving a class a process-wide instance persisted under its
+    DEFAULT_PATH, returned by shared()."""
+
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """Return process-wide instance persisted under DEFAULT_PATH."""
+        with cls._shared_lock:
+            # Looked up in the class itself, so subclasses get their own
+            if "_shared" not in cls.__dict__:
+                cls._shared = cls(cls.DEFAULT_PATH)
+            return cls._shared
@@ -1,7 +1,43 @@
 """Plugin abstract base class"""
 
+import datetime
+
 class Plugin(object):
 
+    # Seconds the diary waits for this plugin to be built before using a
+    # placeholder. None means use the formatter's default.
+    timeout = None
+
+    # Seconds this plugin's output may be reused by later diaries (see
+    # PluginCache). 0 means build the plugin every time; None means
+    # reuse output for as long as cache_key() is unchanged.
+    cache_ttl = 0
+
+    # Day of the diary being built, None for today. See today().
+    day = None
+
+    @classmethod
+    def set_day(cls, day):
+        """Set day of the diary being built for all plugins (None for today)"""
+        Plugin.day = day
+
+    @classmethod
+    def today(cls):
+        """Return day of the diary being built as datetime.date.
+
+        Plugins should use this rather than datetime.date.today(), so
+        diaries can be built for other days."""
+        return cls.day or datetime.date.today()
+
+    @classmethod
+    def cache_key(cls):
+        """Return string naming what this plugin's output depends on.
+
+        Cached output is only reused while the key is unchanged. The
+        default is the diary's day (see today()); plugins depending on
+        configuration should add the values they use."""
+        return cls.today().isoformat()
+
     conf = None
 
     @classmethod
@@ -0,0 +1,86 @@
+"""Cache of plugin output"""
+
+import os.path
+import threading
+import time
+
+import PickleStore
+
+class PluginCache(PickleStore.Shared):
+    """Output of diary plugins, reused as each plugin's policy allows.
+
+    A plugin's output, its str(), is stored under its name along with
+    the time it was built and its cache_key(). It is reused while the
+    key is unchanged and it is younger than the plugin's cache_ttl.
+    Plugins with a cache_ttl of 0 are never cached. Output is kept in
+    memory and optionally as pickles under a directory, so later runs
+    share it too."""
+
+    DEFAULT_PATH = "~/.evernote/cache/plugins"
+
+    def __init__(self, path=None):
+        """path is the directory to persist output in, None for memory only."""
+        self.path = os.path.expanduser(path) if path else None
+        self._lock = threading.Lock()
+        # name -> (time built, cache key, output)
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def caches(cls, plugin_class):
+        """Return True if plugin_class's output may be cached."""
+        return getattr(plugin_class, "cache_ttl", 0) != 0
+
+    def lookup(self, name, plugin_class):
+        """Return cached output of plugin_class, named name, or None."""
+        if not self.caches(plugin_class):
+            return None
+        key = plugin_class.cache_key()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or not self._fresh(entry, key, plugin_class):
+                entry = self._load(name)
+            if entry is None or not self._fresh(entry, key, plugin_class):
+                self.misses += 1
+                return None
+            self._entries[name] = entry
+            self.hits += 1
+        return entry[2]
+
+    def store(self, name, plugin_class, output):
+        """Save output built by plugin_class, named name, if it caches."""
+        if not self.caches(plugin_class):
+            return
+        entry = (time.time(), plugin_class.cache_key(), output)
+        with self._lock:
+            self._entries[name] = entry
+            self._save(name, entry)
+
+    def stats(self):
+        """Return dictionary with hit and miss counts."""
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            }
+
+    def _fresh(self, entry, key, plugin_class):
+        built, entry_key, output = entry
+        if entry_key != key:
+            return False
+        ttl = plugin_class.cache_ttl
+        return ttl is None or time.time() - built < ttl
+
+    def _file(self, name):
+        return os.path.join(self.path, "{}.pickle".format(name))
+
+    def _load(self, name):
+        """Return (time built, key, output) persisted for name, or None."""
+        if not self.path:
+            return None
+        return PickleStore.load(self._file(name))
+
+    def _save(self, name, entry):
+        if not self.path:
+            return
+        PickleStore.save(self._file(name), entry)
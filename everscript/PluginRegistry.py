@@ -0,0 +1,165 @@
+"""Registry of the plugins available to diary templates"""
+
+import hashlib
+import importlib
+import os
+import os.path
+import sys
+import threading
+import types
+
+class PluginRegistry(object):
+    """Plugins found once, up front, and imported on first use.
+
+    Plugins come from files named <key>.py in a directory, and from
+    installed packages declaring entry points in ENTRY_POINT_GROUP,
+    named by key. A file takes precedence over an entry point with the
+    same key, until the file is removed. Files are imported as modules
+    of a package made for the directory, so the usual import machinery
+    compiles each once and reuses its cached bytecode.
+
+    The directory is scanned again whenever its modification time
+    changes, and a plugin file edited since it was imported is
+    reloaded, so long-running processes pick up added, removed and
+    changed plugins. Entry points are only read once."""
+
+    ENTRY_POINT_GROUP = "everscript.plugins"
+
+    # path -> PluginRegistry, see shared()
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path=None, entry_points=True):
+        """path is the directory of plugin files, or None for none.
+
+        entry_points says whether to look for plugins in installed
+        packages, which needs setuptools' pkg_resources."""
+        self.path = os.path.abspath(os.path.expanduser(path)) \
+            if path else None
+        self._lock = threading.Lock()
+        # key -> pkg_resources.EntryPoint
+        self._entry_points = {}
+        # key -> file name or pkg_resources.EntryPoint
+        self._sources = {}
+        # key -> Plugin class, once imported
+        self._classes = {}
+        # key -> modification time of plugin file when imported
+        self._imported = {}
+        # Modification time of path when last scanned
+        self._scanned = None
+        if entry_points:
+            self._scan_entry_points()
+        if self.path:
+            self._scan_path()
+
+    @classmethod
+    def shared(cls, path=None):
+        """Return process-wide registry for the plugin directory path."""
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path)
+            return cls._shared[path]
+
+    def _scan_path(self):
+        """Set sources to the entry points and the files now in path.
+
+        Plugins whose source has changed, e.g. a file which was
+        removed, are imported again on next use."""
+        sources = dict(self._entry_points)
+        try:
+            self._scanned = os.path.getmtime(self.path)
+            names = os.listdir(self.path)
+        except OSError:
+            self._scanned = None
+            names = []
+        for name in names:
+            key, extension = os.path.splitext(name)
+            if extension == ".py" and not key.startswith("_"):
+                sources[key] = name
+        for key, source in self._sources.items():
+            if sources.get(key) != source:
+                self._classes.pop(key, None)
+                self._imported.pop(key, None)
+        self._sources = sources
+
+    def _check_path(self):
+        """Scan path again if it has changed since last scanned."""
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime == self._scanned:
+                return
+            self._scan_path()
+
+    def _scan_entry_points(self):
+        try:
+            import pkg_resources
+        except ImportError:
+            return
+        for entry_point in pkg_resources.iter_entry_points(
+                self.ENTRY_POINT_GROUP):
+            self._entry_points[entry_point.name] = entry_point
+        self._sources.update(self._entry_points)
+
+    def keys(self):
+        """Return sorted list of the keys of all plugins found."""
+        self._check_path()
+        return sorted(self._sources)
+
+    def __contains__(self, key):
+        self._check_path()
+        return key in self._sources
+
+    def plugin_class(self, key):
+        """Return Plugin class for key, or None if there is no plugin.
+
+        The plugin is imported on first use, and a plugin file again
+        if it has been edited since. Exceptions raised while importing
+        it are passed on."""
+        self._check_path()
+        source = self._sources.get(key)
+        if source is None:
+            return None
+        with self._lock:
+            if isinstance(source, basestring):
+                try:
+                    mtime = os.path.getmtime(os.path.join(self.path, source))
+                except OSError:
+                    mtime = None
+                if key not in self._classes or self._imported[key] != mtime:
+                    self._classes[key] = self._import_file(key, mtime)
+            elif key not in self._classes:
+                loaded = source.load()
+                if isinstance(loaded, types.ModuleType):
+                    loaded = loaded.Plugin
+                self._classes[key] = loaded
+            return self._classes[key]
+
+    def _import_file(self, key, mtime):
+        """Return Plugin class of the plugin file for key, modified at
+        mtime, reloading its module if imported before that.
+
+        Must be called with self._lock held."""
+        name = "{}.{}".format(self._package(), key)
+        module = sys.modules.get(name)
+        if module is None:
+            module = importlib.import_module(name)
+        elif self._imported.get(key) != mtime:
+            module = reload(module)
+        self._imported[key] = mtime
+        return module.Plugin
+
+    def _package(self):
+        """Return name of the package holding modules of plugin files,
+        creating it if needed."""
+        name = "everscript_plugins_{}".format(
+            hashlib.sha1(self.path).hexdigest()[:8])
+        if name not in sys.modules:
+            package = types.ModuleType(name)
+            package.__path__ = [self.path]
+            sys.modules[name] = package
+        return name
@@ -0,0 +1,77 @@
+"""Lazy, composable query over a collection of notes"""
+
+import itertools
+
+class Query(object):
+    """Predicates and a limit applied to a collection of notes.
+
+    Queries are built up with where(), or_() and limit(), each of which
+    returns a new Query. Nothing is evaluated until the query is
+    iterated, and then every note is tested in a single pass, stopping
+    as soon as limit matches have been found. For example:
+
+        todos.where(ToDo.past_due).or_(ToDo.due_today).limit(20)
+    """
+
+    def __init__(self, notes, predicate=None, limit=None):
+        """notes is a Notes instance (or any iterable of notes).
+
+        predicate is a function taking a note, or None to match every
+        note. limit is the maximum number of notes to return, or None."""
+        self.notes = notes
+        self.predicate = predicate
+        self.max_count = limit
+
+    def _copy(self, predicate=None, limit=None):
+        return Query(self.notes,
+                     predicate=predicate or self.predicate,
+                     limit=limit if limit is not None else self.max_count)
+
+    def where(self, predicate):
+        """Return query also requiring predicate to be true."""
+        if self.predicate is None:
+            return self._copy(predicate=predicate)
+        current = self.predicate
+        return self._copy(predicate=lambda n: current(n) and predicate(n))
+
+    def or_(self, predicate):
+        """Return query also matching notes for which predicate is true."""
+        if self.predicate is None:
+            # Already matches everything
+            return self._copy()
+        current = self.predicate
+        return self._copy(predicate=lambda n: current(n) or predicate(n))
+
+    def limit(self, count):
+        """Return query stopping after count matches."""
+        if self.max_count is not None:
+            count = min(count, self.max_count)
+        return self._copy(limit=count)
+
+    def __iter__(self):
+        if self.predicate is None:
+            matches = iter(self.notes)
+        else:
+            matches = itertools.ifilter(self.predicate, self.notes)
+        if self.max_count is not None:
+            matches = itertools.islice(matches, self.max_count)
+        return matches
+
+    def first(self):
+        """Return first matching note, or None if there is none."""
+        for note in self.limit(1):
+            return note
+        return None
+
+    def count(self):
+        """Return number of matching notes."""
+        return sum(1 for note in self)
+
+    def all(self):
+        """Return matching notes as a collection of the queried type.
+
+        If the query is over a Notes instance, the result is an
+        instance of the same class (e.g. ToDos)."""
+        if hasattr(self.notes, "_from_items"):
+            return self.notes._from_items(self)
+        return list(self)
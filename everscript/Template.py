@@ -0,0 +1,65 @@
+"""Format string compiled once for repeated rendering"""
+
+import string
+
+class Template(object):
+    """A str.format() style template parsed into chunks once.
+
+    Each chunk is either a literal string or a field slot of (field
+    name, conversion, format spec, simple), where a format spec holding
+    fields of its own is itself a Template and simple is True for a
+    plain name with no attribute or index. Rendering fills the slots
+    without parsing the template again. Templates can be pickled, so
+    compiled templates can be cached (see TemplateCache)."""
+
+    def __init__(self, source):
+        # List of literal strings and field slots
+        self.chunks = []
+        # Keys of the fields, including those in format specs
+        self.keys = set()
+        for literal, field_name, format_spec, conversion in \
+                string.Formatter().parse(source):
+            if literal:
+                self.chunks.append(literal)
+            if field_name is None:
+                continue
+            if "{" in format_spec:
+                format_spec = Template(format_spec)
+                self.keys.update(format_spec.keys)
+            # Key is the field name up to any attribute or index
+            key, rest = field_name._formatter_field_name_split()
+            if isinstance(key, basestring) and key:
+                self.keys.add(key)
+            simple = (key == field_name and conversion is None)
+            self.chunks.append((field_name, conversion, format_spec, simple))
+
+    def render(self, values=None, formatter=None):
+        """Return template with fields filled from dictionary values.
+
+        Fields are looked up, converted and formatted by formatter, a
+        string.Formatter (default a plain one), as its format() would,
+        so a formatter with its own get_value() can supply fields."""
+        values = values or {}
+        # A plain formatter's simple fields are filled directly, as
+        # they are by str.format()
+        plain = formatter is None
+        formatter = formatter or string.Formatter()
+        parts = []
+        for chunk in self.chunks:
+            if isinstance(chunk, basestring):
+                parts.append(chunk)
+                continue
+            field_name, conversion, format_spec, simple = chunk
+            if plain and simple and not isinstance(format_spec, Template):
+                parts.append(format(values[field_name], format_spec))
+                continue
+            value, key = formatter.get_field(field_name, (), values)
+            value = formatter.convert_field(value, conversion)
+            if isinstance(format_spec, Template):
+                format_spec = format_spec.render(values, formatter)
+            parts.append(formatter.format_field(value, format_spec))
+        return "".join(parts)
+
+    def format(self, **values):
+        """Return template with fields filled from keyword arguments."""
+        return self.render(values)
@@ -0,0 +1,59 @@
+"""Cache of templates compiled from notes"""
+
+import hashlib
+import os.path
+import threading
+
+import PickleStore
+from Template import Template
+
+class TemplateCache(PickleStore.Shared):
+    """Templates compiled from template notes, keyed by note link.
+
+    A compiled template is reused for as long as its note's
+    modification date is unchanged, so an unchanged template costs
+    neither fetching the note's content nor parsing it. Templates are
+    kept in memory and optionally as pickles under a directory, so
+    later runs share them too."""
+
+    DEFAULT_PATH = "~/.evernote/cache/templates"
+
+    def __init__(self, path=None):
+        """path is the directory to persist templates in, None for memory only."""
+        self.path = os.path.expanduser(path) if path else None
+        self._lock = threading.Lock()
+        # link -> (modification date, Template)
+        self._entries = {}
+
+    def template(self, note):
+        """Return Template compiled from note's content.
+
+        The note's link and modification date are fetched, unless
+        already cached in note; its content only if the template has
+        changed since it was compiled."""
+        link = note.link()
+        modified = note.modification_date()
+        with self._lock:
+            entry = self._entries.get(link)
+            if entry is None or entry[0] != modified:
+                entry = self._load(link)
+            if entry is None or entry[0] != modified:
+                entry = (modified, Template(note.content()))
+                self._save(link, entry)
+            self._entries[link] = entry
+        return entry[1]
+
+    def _file(self, link):
+        digest = hashlib.sha1(link).hexdigest()[:16]
+        return os.path.join(self.path, "{}.pickle".format(digest))
+
+    def _load(self, link):
+        """Return (modification date, Template) persisted for link, or None."""
+        if not self.path:
+            return None
+        return PickleStore.load(self._file(link))
+
+    def _save(self, link, entry):
+        if not self.path:
+            return
+        PickleStore.save(self._file(link), entry)
@@ -1,7 +1,9 @@
 """Evernote note representing a ToDo"""
 
+from collections import OrderedDict
 import datetime
 import re
+import threading
 
 from . import Note
 
@@ -12,14 +14,28 @@ class ToDo(Note):
 
     DUE_ASAP_REGEX = re.compile("\s+ASAP$", re.IGNORECASE)
 
-    def due_today(self):
+    # (title, year) the cached due date was parsed for, and the parsed
+    # date. Set per instance by due_date().
+    _due_date_key = None
+    _due_date = None
+
+    # Number of date strings kept by parse_date()'s shared cache
+    parse_cache_size = 1024
+
+    # Shared LRU cache for parse_date(), keyed by (date string, year
+    # used when the string has none)
+    _parse_cache = OrderedDict()
+    _parse_cache_lock = threading.Lock()
+
+    def due_today(self, today=None):
         """Return True if note is due today.
 
-        Return False if not due today, None if note has no due date."""
+        Return False if not due today, None if note has no due date.
+        today defaults to datetime.date.today()."""
         due_date = self.due_date()
         if due_date is None:
             return None
-        today = datetime.date.today()
+        today = today or datetime.date.today()
         return (today == due_date)
 
     def due_asap(self):
@@ -27,7 +43,7 @@ class ToDo(Note):
         match = self.DUE_ASAP_REGEX.search(self.title())
         return match is not None
 
-    def due_soon(self, days):
+    def due_soon(self, days, today=None):
         """Is task due in the defined future?
 
         Returns False if task is past due or due today.
@@ -37,13 +53,13 @@ class ToDo(Note):
             return None
         soon = datetime.timedelta(days)
         day = datetime.timedelta(1)
-        today = datetime.date.today()
+        today = today or datetime.date.today()
         due_delta = due_date - today
         return ((due_delta >= day) and (due_delta <= soon))
 
         return 
 
-    def due_later(self, days):
+    def due_later(self, days, today=None):
         """Is task due past the defined future?
 
         Returns False if task is due more than or equal to days in the future.
@@ -51,51 +67,92 @@ class ToDo(Note):
         due_date = self.due_date()
         if due_date is None:
             return None
-        later = datetime.timedelta(days) + datetime.date.today()
+        later = datetime.timedelta(days) + (today or datetime.date.today())
         return (due_date >= later)
 
-    def past_due(self):
+    def past_due(self, today=None):
         """Return True if note is past due.
 
         Return True if past due, None if note has no due date, False otherwise."""
         due_date = self.due_date()
         if due_date is None:
             return None
-        today = datetime.date.today()
+        today = today or datetime.date.today()
         return (today > due_date)
 
     def due_date(self):
-        """Return this note's due date as datetime.date"""
-        match = self.DUE_REGEX.search(self.title())
-        if not match:
-            return None
-        return self.parse_date(match.group(1))
+        """Return this note's due date as datetime.date
+
+        The parsed date is kept until the title or the year changes,
+        as M/D dates are in the current year."""
+        key = (self.title(), datetime.date.today().year)
+        if key != self._due_date_key:
+            self._due_date = self.title_due_date(key[0])
+            self._due_date_key = key
+        return self._due_date
+
+    @classmethod
+    def title_due_date(cls, title):
+        """Return due date given in title as datetime.date, or None."""
+        match = cls.DUE_REGEX.search(title)
+        if match:
+            return cls.parse_date(match.group(1))
+        return None
 
     @classmethod
     def parse_date(cls, date_str):
         """Parse date string, returning datetime.date
 
-        Returns None if string cannot be parsed."""
-        formats = [
-            "%m/%d",
-            "%m/%d/%Y",
-            "%m/%d/%y",
-            ]
-        for format in formats:
-            try:
-                # Only datetime has strptime()
-                dt = datetime.datetime.strptime(date_str, format)
-                break  # Success
-            except ValueError:
-                # Failed, try next format
-                pass
-        else:  # No format matached
-            return None
-        year, month, day = dt.year, dt.month, dt.day
-        if year == 1900:
-            # Handle undefined year. This is simplistic and
-            # should use the note creation date perhaps?
-            year = datetime.date.today().year
-        # Convert from datetime to simpler date
-        date = datetime.date(year, month, day)
+        Accepts M/D, M/D/YYYY and M/D/YY. If the year is missing, the
+        current year is used. Returns None if string cannot be parsed.
+        Results are kept in a cache shared by all todos."""
+        # Undated strings depend on the current year, so it is part of the key
+        if date_str.count("/") == 1:
+            default_year = datetime.date.today().year
+        else:
+            default_year = None
+        key = (date_str, default_year)
+        with cls._parse_cache_lock:
+            if key in cls._parse_cache:
+                date = cls._parse_cache.pop(key)
+                cls._parse_cache[key] = date
+                return date
+        date = cls._parse_date(date_str, default_year)
+        with cls._parse_cache_lock:
+            cls._parse_cache[key] = date
+            while len(cls._parse_cache) > cls.parse_cache_size:
+                cls._parse_cache.popitem(last=False)
         return date
+
+    @classmethod
+    def _parse_date(cls, date_str, default_year):
+        """Parse date string without caching, returning datetime.date or None.
+
+        Hand-written equivalent of trying strptime() with "%m/%d",
+        "%m/%d/%Y" and "%m/%d/%y", which is much slower."""
+        fields = date_str.split("/")
+        if len(fields) == 2:
+            month, day = fields
+            year = default_year
+        elif len(fields) == 3:
+            month, day, year = fields
+            if not year.isdigit():
+                return None
+            if len(year) == 4:
+                year = int(year)
+            elif len(year) == 2:
+                # Same pivot as strptime's %y
+                year = int(year)
+                year += 1900 if year >= 69 else 2000
+            else:
+                return None
+        else:
+            return None
+        if not (month.isdigit() and 0 < len(month) <= 2 and
+                day.isdigit() and 0 < len(day) <= 2):
+            return None
+        try:
+            return datetime.date(year, int(month), int(day))
+        except ValueError:
+            # Out of range month or day
+            return None
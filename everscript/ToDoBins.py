@@ -0,0 +1,92 @@
+"""Due date bins of todos kept up to date from note changes"""
+
+from collections import OrderedDict
+import datetime
+
+from NotebookSync import NoteChange
+from ToDos import DueDateBins, ToDos
+
+# Indexes of the DueDateBins fields
+PAST_DUE, DUE_TODAY, DUE_ASAP, DUE_SOON, DUE_LATER, NO_DUE_DATE = \
+    range(len(DueDateBins._fields))
+
+class ToDoBins(object):
+    """Todos binned by due date, updated from NoteChanges.
+
+    Meant as a NotebookSync listener: each change re-bins just the
+    todo concerned. Bins follow the rules of ToDos.bin_by_due_date().
+    A todo keeps its place in a bin while it stays in it; todos moving
+    into a bin go at its end. When the day changes every todo is
+    re-binned without app calls, from its already parsed due date
+    unless the year has changed too (see ToDo.due_date())."""
+
+    def __init__(self, soon_days=7, later_days=8):
+        self.soon_days = soon_days
+        self.later_days = later_days
+        # link -> ToDo, in the order todos were first seen
+        self.todos = OrderedDict()
+        # Day the bins are for, None until bins() is first called
+        self.today = None
+        # link -> ToDo for each DueDateBins field
+        self._bins = [OrderedDict() for field in DueDateBins._fields]
+        # link -> indexes of the bins the todo is in
+        self._placed = {}
+
+    def __call__(self, changes):
+        self.apply(changes)
+
+    def apply(self, changes):
+        """Update bins from a list of NoteChanges."""
+        for change in changes:
+            if change.kind == NoteChange.REMOVED:
+                self.todos.pop(change.link, None)
+                for index in self._placed.pop(change.link, ()):
+                    del self._bins[index][change.link]
+            else:
+                self.todos[change.link] = change.note
+                if self.today is not None:
+                    self._place(change.link, change.note)
+
+    def bins(self, today=None):
+        """Return DueDateBins as of today (default datetime.date.today())."""
+        today = today or datetime.date.today()
+        if today != self.today:
+            self.today = today
+            for todos in self._bins:
+                todos.clear()
+            self._placed.clear()
+            for link, todo in self.todos.items():
+                self._place(link, todo)
+        return DueDateBins(*[ToDos._from_items(todos.values())
+                             for todos in self._bins])
+
+    def _indexes(self, todo):
+        """Return indexes of the bins todo belongs in."""
+        indexes = []
+        if todo.due_asap():
+            indexes.append(DUE_ASAP)
+        due_date = todo.due_date()
+        if due_date is None:
+            indexes.append(NO_DUE_DATE)
+            return indexes
+        days = (due_date - self.today).days
+        if days < 0:
+            indexes.append(PAST_DUE)
+        elif days == 0:
+            indexes.append(DUE_TODAY)
+        elif days <= self.soon_days:
+            indexes.append(DUE_SOON)
+        if days >= self.later_days:
+            indexes.append(DUE_LATER)
+        return indexes
+
+    def _place(self, link, todo):
+        """Put todo in the bins it belongs in, taking it out of others."""
+        indexes = self._indexes(todo)
+        for index in self._placed.get(link, ()):
+            if index not in indexes:
+                del self._bins[index][link]
+        for index in indexes:
+            # Replacing an existing entry keeps its place
+            self._bins[index][link] = todo
+        self._placed[link] = indexes
@@ -0,0 +1,210 @@
+"""Compact, columnar table of todos"""
+
+from array import array
+import datetime
+
+from ToDo import ToDo
+
+# Bits of ToDoTable.flags
+ASAP = 0x01
+
+class ToDoRecord(object):
+    """A todo as plain values, without an app reference.
+
+    Has the same link(), title(), due_date() and due_asap() methods as
+    ToDo, so may be used where a ToDo is only read, e.g. rendered."""
+
+    __slots__ = ("_link", "_title", "_due", "_flags")
+
+    def __init__(self, link, title, due=0, flags=0):
+        """due is the due date's proleptic ordinal, 0 for none."""
+        self._link = link
+        self._title = title
+        self._due = due
+        self._flags = flags
+
+    def link(self):
+        return self._link
+
+    def title(self):
+        return self._title
+
+    def due_date(self):
+        """Return due date as datetime.date, or None."""
+        if not self._due:
+            return None
+        return datetime.date.fromordinal(self._due)
+
+    def due_asap(self):
+        """Is task marked as due ASAP?"""
+        return bool(self._flags & ASAP)
+
+    def __repr__(self):
+        return "ToDoRecord({!r}, {!r})".format(self._link, self._title)
+
+class ToDoTable(object):
+    """Todos held a column per field rather than an object per todo.
+
+    Links and titles are kept in lists, due dates (as ordinals, 0 for
+    none) and flags in arrays of machine integers, so a row costs a
+    few dozen bytes on top of its strings and holds no app reference.
+    Due dates are parsed once, when rows are added. Filters compare
+    the due date column against a single snapshot of today and return
+    row numbers in table order; take() turns those into a new table."""
+
+    def __init__(self):
+        self.links = []
+        self.titles = []
+        self.due = array("i")
+        self.flags = array("B")
+
+    @classmethod
+    def from_todos(cls, todos):
+        """Return table of the todos in a ToDos, in the same order.
+
+        Note links and titles are fetched in bulk."""
+        todos.prefetch("note_link", "title")
+        table = cls()
+        table.extend(todos.titles(), [todo.link() for todo in todos])
+        return table
+
+    def append(self, title, link=None):
+        """Add a row for the todo with the given title."""
+        self.extend([title], [link])
+
+    def extend(self, titles, links=None):
+        """Add a row for each title, with the matching link if given."""
+        titles = list(titles)
+        if links is None:
+            links = [None] * len(titles)
+        # Locals, as this runs once per row
+        search_due = ToDo.DUE_REGEX.search
+        search_asap = ToDo.DUE_ASAP_REGEX.search
+        parse_date = ToDo.parse_date
+        due, flags = [], []
+        for title in titles:
+            match = search_due(title)
+            due_date = parse_date(match.group(1)) if match else None
+            due.append(due_date.toordinal() if due_date else 0)
+            flags.append(ASAP if search_asap(title) else 0)
+        self.links.extend(links)
+        self.titles.extend(titles)
+        self.due.extend(due)
+        self.flags.extend(flags)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self.record(i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(xrange(*i.indices(len(self))))
+        return self.record(i)
+
+    def record(self, i):
+        """Return row i as a ToDoRecord."""
+        return ToDoRecord(self.links[i], self.titles[i],
+                          self.due[i], self.flags[i])
+
+    def take(self, rows):
+        """Return new table holding the given rows, in the given order."""
+        table = ToDoTable()
+        table.links = [self.links[i] for i in rows]
+        table.titles = [self.titles[i] for i in rows]
+        table.due = array("i", [self.due[i] for i in rows])
+        table.flags = array("B", [self.flags[i] for i in rows])
+        return table
+
+    def todo(self, i, note=None):
+        """Return row i as a ToDo, with its title cached.
+
+        note is the todo's app reference, if known; otherwise it is
+        looked up by link when a property other than title is used."""
+        todo = ToDo(note, link=self.links[i])
+        todo.set_cached("title", self.titles[i])
+        return todo
+
+    def to_todos(self):
+        """Return ToDos of the rows, looked up by link when used.
+
+        Titles are cached, so only other properties go to the app."""
+        # Avoid circular import
+        from ToDos import ToDos
+        return ToDos._from_items(self.todo(i) for i in xrange(len(self)))
+
+    #
+    # Filters, each returning a list of row numbers
+
+    def rows_due_between(self, start, end):
+        """Return rows due on or after date start and before date end.
+
+        Either may be None for no bound. Rows without a due date never
+        match."""
+        low = start.toordinal() if start else 1
+        high = end.toordinal() if end else 0x7fffffff
+        return [i for i, due in enumerate(self.due) if low <= due < high]
+
+    def past_due(self, today=None):
+        """Rows due before today."""
+        today = today or datetime.date.today()
+        return self.rows_due_between(None, today)
+
+    def due_today(self, today=None):
+        """Rows due today."""
+        today = today or datetime.date.today()
+        return self.rows_due_between(today, today + datetime.timedelta(1))
+
+    def due_soon(self, soon_days=7, today=None):
+        """Rows due 1 to soon_days days from today."""
+        today = today or datetime.date.today()
+        return self.rows_due_between(today + datetime.timedelta(1),
+                                     today + datetime.timedelta(soon_days + 1))
+
+    def due_later(self, later_days=8, today=None):
+        """Rows due later_days or more days from today."""
+        today = today or datetime.date.today()
+        return self.rows_due_between(today + datetime.timedelta(later_days),
+                                     None)
+
+    def due_asap(self):
+        """Rows marked ASAP."""
+        return [i for i, flags in enumerate(self.flags) if flags & ASAP]
+
+    def without_due_date(self):
+        """Rows without a due date."""
+        return [i for i, due in enumerate(self.due) if not due]
+
+    def bin_rows(self, today=None, soon_days=7, later_days=8):
+        """Return lists of rows in each bin of ToDos.bin_by_due_date().
+
+        The lists are in DueDateBins order, found in one pass."""
+        today = (today or datetime.date.today()).toordinal()
+        past_due, due_today, due_asap = [], [], []
+        due_soon, due_later, no_due_date = [], [], []
+        for i, (due, flags) in enumerate(zip(self.due, self.flags)):
+            if flags & ASAP:
+                due_asap.append(i)
+            if not due:
+                no_due_date.append(i)
+                continue
+            days = due - today
+            if days < 0:
+                past_due.append(i)
+            elif days == 0:
+                due_today.append(i)
+            elif days <= soon_days:
+                due_soon.append(i)
+            if days >= later_days:
+                due_later.append(i)
+        return [past_due, due_today, due_asap,
+                due_soon, due_later, no_due_date]
+
+    def bin_by_due_date(self, today=None, soon_days=7, later_days=8):
+        """Return DueDateBins whose fields are ToDoTables."""
+        # Avoid circular import
+        from ToDos import DueDateBins
+        return DueDateBins(*[self.take(rows) for rows in
+                             self.bin_rows(today, soon_days, later_days)])
@@ -1,52 +1,218 @@
 """Collection of ToDo notes"""
 
+from collections import namedtuple
 import datetime
+import threading
 
 from . import EverNote, Notes, ToDo
+from ToDoTable import ToDoTable
+
+# Result of ToDos.bin_by_due_date(). Each field is a ToDos instance.
+# due_asap holds todos marked ASAP regardless of their due date, so
+# those todos also appear in one of the other bins.
+DueDateBins = namedtuple("DueDateBins",
+                         ["past_due", "due_today", "due_asap",
+                          "due_soon", "due_later", "no_due_date"])
 
 class ToDos(Notes):
+    """Collection of ToDo notes.
+
+    Todos read from a notebook are held as a ToDoTable of their titles
+    and parsed due dates, alongside their app references, rather than
+    as ToDo objects, and so are the results of filters and bins. ToDo
+    objects are made from the table when items are used. Todos given
+    as items (see _from_items()) are kept as they are, with a table
+    built from them when a filter needs one."""
 
     _item_class = ToDo
 
+    notebook = None
+
+    # List of ToDos, or None if made from _table on first use
+    _items = None
+
+    # ToDoTable of the todos, see table()
+    _table = None
+    # App references of _table's rows, or None to look notes up by link
+    _table_notes = None
+    # (hash of titles, year) _table was built for. M/D due dates are
+    # parsed against the current year, so the table is rebuilt when
+    # it changes.
+    _table_key = None
+
+    # notebook -> (NotebookSync, ToDoBins, lock), see cached_bins()
+    _synced = {}
+    _synced_lock = threading.Lock()
+
     def __init__(self, notebook=None, search_term=""):
         self.notebook = notebook
         if notebook:
             notes = EverNote.find_notes(search_term=search_term,
-                                        notebook=notebook).notes
+                                        notebook=notebook)
+            # Links are only known for notes served from NoteCache
+            table = ToDoTable()
+            table.extend(notes.titles(), [note._link for note in notes])
+            self._set_table(table, [note._note for note in notes])
         else:
-            notes = []
-        Notes.__init__(self, notes)
-    
+            self._items = []
+
+    @classmethod
+    def _from_table(cls, table, notes=None):
+        """Return a new instance holding the rows of ToDoTable table,
+        whose app references are in list notes, if known.
+
+        Bypasses __init__, like _from_items()."""
+        todos = cls.__new__(cls)
+        todos._set_table(table, notes)
+        return todos
+
+    def _set_table(self, table, notes=None):
+        self._table = table
+        self._table_notes = notes
+        self._table_key = (hash(tuple(table.titles)),
+                           datetime.date.today().year)
+
+    def _table_only(self):
+        """Return True if the table is the only copy of the todos."""
+        return self._items is None and self._table is not None
+
+    def _todo(self, i):
+        """Return ToDo for row i of the table."""
+        return self._table.todo(
+            i, self._table_notes[i] if self._table_notes else None)
+
+    @property
+    def items(self):
+        """List of ToDos, made from the table on first use."""
+        if self._items is None:
+            self._items = [self._todo(i) for i in xrange(len(self._table))] \
+                if self._table is not None else []
+            self._table_notes = None
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        self._items = items
+
+    def __len__(self):
+        if self._table_only():
+            return len(self._table)
+        return len(self.items)
+
+    def __iter__(self):
+        """Iterate over todos. If held as a table, a ToDo is made for
+        each as it is reached rather than kept."""
+        if self._table_only():
+            return (self._todo(i) for i in xrange(len(self._table)))
+        return iter(self.items)
+
+    def titles(self):
+        if self._table_only():
+            return list(self._table.titles)
+        return Notes.titles(self)
+
+    def prefetch(self, *properties):
+        # Titles of todos held as a table are in the table
+        if self._table_only():
+            properties = [name for name in properties if name != "title"]
+        return Notes.prefetch(self, *properties)
+
+    def table(self):
+        """Return ToDoTable of these todos, rows in the same order.
+
+        Titles are fetched in bulk. The table is kept until the todos'
+        titles or the year change, so filters after the first skip
+        parsing dates."""
+        year = datetime.date.today().year
+        if self._table_only():
+            if self._table_key[1] != year:
+                table = ToDoTable()
+                table.extend(self._table.titles, self._table.links)
+                self._set_table(table, self._table_notes)
+            return self._table
+        titles = self.titles()
+        key = (hash(tuple(titles)), year)
+        if key != self._table_key:
+            self._table = ToDoTable()
+            self._table.extend(titles)
+            self._table_key = key
+        return self._table
+
+    def _take(self, rows):
+        """Return ToDos holding the todos at the given rows of table()."""
+        if self._table_only():
+            table = self.table()
+            notes = self._table_notes
+            return self._from_table(table.take(rows),
+                                    [notes[i] for i in rows] if notes
+                                    else None)
+        items = self.items
+        return self._from_items([items[i] for i in rows])
+
     def due_today(self):
         """Return Todos with subset of todos due today."""
-        return self.filter(lambda t: t.due_today())
+        return self._take(self.table().due_today())
 
     def past_due(self):
         """Return Todos with subset of todos due prior to tody."""
-        today = datetime.date.today()
-        return self.filter(lambda t: t.past_due())
+        return self._take(self.table().past_due())
 
     def due_asap(self):
         """Returns Todos with subset of todos due ASAP."""
-        return self.filter(lambda t: t.due_asap())
+        return self._take(self.table().due_asap())
 
     def without_due_date(self):
         """Return Todos with subset of todos without due date."""
-        return self.filter(lambda t: t.due_date() is None)
+        return self._take(self.table().without_due_date())
 
     def due_soon(self, soon_days=7):
         """Return Todos with subset of todos due in next soon_days days."""
-        return self.filter(lambda t: t.due_soon(soon_days))
+        return self._take(self.table().due_soon(soon_days))
 
     def due_later(self, later_days=8):
         """Return Todos with subset of todos due later_days or more from today."""
-        later = datetime.date.today() + datetime.timedelta(later_days)
-        return self.filter(lambda t: t.due_later(later_days))
-
-    def filter(self, filter_function):
-        """Return Todos with subset of tods that evaluate to True with filter_function."""
-        todos = ToDos()
-        for todo in self:
-            if filter_function(todo):
-                todos.append(todo)
-        return todos
+        return self._take(self.table().due_later(later_days))
+
+    def due_between(self, start, end):
+        """Return Todos with subset of todos due on or after date start
+        and before date end. Either may be None for no bound."""
+        return self._take(self.table().rows_due_between(start, end))
+
+    def bin_by_due_date(self, today=None, soon_days=7, later_days=8):
+        """Split todos into bins by due date in a single pass.
+
+        Returns a DueDateBins. Each todo's due date is parsed once and
+        compared against a single snapshot of today (which defaults to
+        datetime.date.today()). Bins match the corresponding filter
+        methods: due_soon is 1 to soon_days days away and due_later is
+        later_days or more away, so with the defaults every dated todo
+        lands in exactly one of past_due, due_today, due_soon and
+        due_later."""
+        return DueDateBins(*[self._take(rows) for rows in
+                             self.table().bin_rows(today, soon_days,
+                                                   later_days)])
+
+    @classmethod
+    def cached_bins(cls, notebook, today=None):
+        """Return DueDateBins for the todos in notebook, kept up to date.
+
+        The first call for a notebook reads all of it. Later calls use
+        a NotebookSync to fetch only the todos added, modified or
+        removed since, and update a ToDoBins from those changes. Meant
+        for long-running processes such as the daemon."""
+        today = today or datetime.date.today()
+        if not notebook:
+            return cls().bin_by_due_date(today=today)
+        # Avoid circular import
+        from NotebookSync import NotebookSync
+        from ToDoBins import ToDoBins
+        with cls._synced_lock:
+            if notebook not in cls._synced:
+                sync = NotebookSync(notebook, collection_class=cls)
+                bins = ToDoBins()
+                sync.add_listener(bins)
+                cls._synced[notebook] = (sync, bins, threading.Lock())
+            sync, bins, lock = cls._synced[notebook]
+        with lock:
+            sync.sync()
+            return bins.bins(today)
@@ -0,0 +1,225 @@
+"""Backend recording every call made to another backend"""
+
+import json
+import logging
+import threading
+import time
+
+from Backend import Backend
+
+class TraceEvent(object):
+    """One backend round trip"""
+
+    def __init__(self, operation, arguments, duration, size, error=None):
+        self.operation = operation
+        # Short descriptions of the arguments (see describe())
+        self.arguments = arguments
+        # Seconds the call took
+        self.duration = duration
+        # Number of items (or characters) returned, or of references
+        # sent, whichever is larger; 0 for scalar values
+        self.size = size
+        # Exception raised by the call, if any
+        self.error = error
+
+    def to_dict(self):
+        return {
+            "operation" : self.operation,
+            "arguments" : self.arguments,
+            "duration" : self.duration,
+            "size" : self.size,
+            "error" : str(self.error) if self.error else None,
+            }
+
+    def __str__(self):
+        s = "{}({}) {:.1f}ms size:{}".format(self.operation,
+                                             ", ".join(self.arguments),
+                                             self.duration * 1000,
+                                             self.size)
+        if self.error:
+            s += " error:{}".format(self.error)
+        return s
+
+def describe(value):
+    """Return short description of a call argument."""
+    if isinstance(value, (list, tuple)):
+        return "<{} items>".format(len(value))
+    if isinstance(value, basestring):
+        if len(value) > 40:
+            value = value[:37] + "..."
+        return repr(value)
+    if value is None or isinstance(value, (int, long, float)):
+        return repr(value)
+    return "<{}>".format(type(value).__name__)
+
+def size_of(value):
+    """Return payload size of a value for TraceEvent."""
+    if isinstance(value, (list, tuple, basestring)):
+        return len(value)
+    return 0
+
+class TracingBackend(Backend):
+    """Wraps a backend, passing a TraceEvent for each call to every sink.
+
+    A sink is any object with a record(event) method."""
+
+    def __init__(self, backend, sinks=()):
+        self.backend = backend
+        self.sinks = list(sinks)
+
+    @classmethod
+    def install(cls, *sinks):
+        """Trace every call EverNote makes from now on. Returns the backend."""
+        # Avoid circular import
+        from EverNote import EverNote
+        tracing = cls(EverNote.backend, sinks)
+        EverNote.set_backend(tracing)
+        return tracing
+
+    def _trace(self, operation, function, *args, **kwargs):
+        """Return function(*args, **kwargs), recording the call."""
+        start = time.time()
+        error = None
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            values = list(args) + [kwargs[k] for k in sorted(kwargs)]
+            event = TraceEvent(operation,
+                               [describe(arg) for arg in args] +
+                               ["{}={}".format(k, describe(kwargs[k]))
+                                for k in sorted(kwargs)],
+                               time.time() - start,
+                               max([size_of(result)] +
+                                   [len(value) for value in values
+                                    if isinstance(value, (list, tuple))]),
+                               error)
+            for sink in self.sinks:
+                sink.record(event)
+
+    def create_note(self, title, notebook=None, with_html=None,
+                    with_text=None):
+        return self._trace("create_note", self.backend.create_note,
+                           title, notebook=notebook, with_html=with_html,
+                           with_text=with_text)
+
+    def find_notes(self, query):
+        return self._trace("find_notes", self.backend.find_notes, query)
+
+    def find_note(self, link):
+        return self._trace("find_note", self.backend.find_note, link)
+
+    def get(self, reference, name):
+        return self._trace("get." + name, self.backend.get, reference, name)
+
+    def get_properties(self, references, name):
+        return self._trace("get_properties." + name,
+                           self.backend.get_properties, references, name)
+
+    def count_notes(self, notebook):
+        return self._trace("count_notes", self.backend.count_notes, notebook)
+
+    def notebook_notes(self, notebook, start, end):
+        return self._trace("notebook_notes", self.backend.notebook_notes,
+                           notebook, start, end)
+
+    def modification_dates(self, notebook):
+        return self._trace("modification_dates",
+                           self.backend.modification_dates, notebook)
+
+    def note_versions(self, notebook):
+        return self._trace("note_versions", self.backend.note_versions,
+                           notebook)
+
+    def open_collection_window(self, query_string=None):
+        return self._trace("open_collection_window",
+                           self.backend.open_collection_window, query_string)
+
+    def open_note_window(self, reference):
+        return self._trace("open_note_window",
+                           self.backend.open_note_window, reference)
+
+######################################################################
+#
+# Sinks
+
+class LoggingSink(object):
+    """Logs each call to a logging.Logger."""
+
+    def __init__(self, logger, level=logging.DEBUG):
+        self.logger = logger
+        self.level = level
+
+    def record(self, event):
+        self.logger.log(self.level, "App call: {}".format(event))
+
+class HistogramSink(object):
+    """Keeps call counts, durations and sizes per operation in memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # operation -> list of (duration, size)
+        self.calls = {}
+
+    def record(self, event):
+        with self._lock:
+            self.calls.setdefault(event.operation, []).append(
+                (event.duration, event.size))
+
+    def stats(self):
+        """Return dictionary of per-operation statistics.
+
+        Each value is a dictionary with calls, total, mean, p50, p99
+        and max (durations in seconds) and items (total size)."""
+        stats = {}
+        with self._lock:
+            calls = dict((op, list(c)) for op, c in self.calls.items())
+        for operation, records in calls.items():
+            durations = sorted(duration for duration, size in records)
+            count = len(durations)
+            total = sum(durations)
+            stats[operation] = {
+                "calls" : count,
+                "total" : total,
+                "mean" : total / count,
+                "p50" : durations[int(0.5 * (count - 1))],
+                "p99" : durations[int(0.99 * (count - 1))],
+                "max" : durations[-1],
+                "items" : sum(size for duration, size in records),
+                }
+        return stats
+
+    def summary(self):
+        """Return table of statistics, slowest operations first."""
+        stats = self.stats()
+        lines = ["{:32s} {:>7s} {:>10s} {:>9s} {:>9s} {:>9s} {:>9s}".format(
+                "operation", "calls", "total ms", "mean ms", "p50 ms",
+                "p99 ms", "items")]
+        for operation, s in sorted(stats.items(),
+                                   key=lambda item: -item[1]["total"]):
+            lines.append(
+                "{:32s} {:>7d} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9d}".format(
+                    operation, s["calls"], s["total"] * 1000,
+                    s["mean"] * 1000, s["p50"] * 1000, s["p99"] * 1000,
+                    s["items"]))
+        return "\n".join(lines) + "\n"
+
+class JSONLinesSink(object):
+    """Appends each call as a line of JSON to a file."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self.file = open(path, "a")
+
+    def record(self, event):
+        line = json.dumps(dict(event.to_dict(), time=time.time()))
+        with self._lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
@@ -1,7 +1,92 @@
+"""A python/appscript interface to EverNote
+
+Classes are imported from their modules the first time they are used,
+so importing the package is cheap and a program only loads the
+modules (and appscript, sqlite3 and so on) it needs."""
+
+import importlib
+import sys
+import types
+
 from constants import *
-from EverNote import EverNote, EverNoteException
-from Note import Note
-from Notes import Notes
-from Plugin import Plugin
-from ToDo import ToDo
-from ToDos import ToDos
+
+# Public name -> module within the package defining it
+_exports = {
+    "AppPool" : "AppPool",
+    "Backend" : "Backend",
+    "AppscriptBackend" : "AppscriptBackend",
+    "MemoryBackend" : "MemoryBackend",
+    "LatencyBackend" : "LatencyBackend",
+    "TracingBackend" : "TracingBackend",
+    "TraceEvent" : "TracingBackend",
+    "LoggingSink" : "TracingBackend",
+    "HistogramSink" : "TracingBackend",
+    "JSONLinesSink" : "TracingBackend",
+    "EverNote" : "EverNote",
+    "EverNoteException" : "EverNoteException",
+    "Note" : "Note",
+    "Notes" : "Notes",
+    "NoteCache" : "NoteCache",
+    "LazyNotes" : "LazyNotes",
+    "HTMLRenderer" : "HTMLRenderer",
+    "Event" : "Event",
+    "EventSource" : "EventSource",
+    "IcalBuddySource" : "EventSource",
+    "ICSSource" : "EventSource",
+    "FakeSource" : "EventSource",
+    "EventCache" : "EventCache",
+    "Plugin" : "Plugin",
+    "PluginCache" : "PluginCache",
+    "PluginRegistry" : "PluginRegistry",
+    "Template" : "Template",
+    "TemplateCache" : "TemplateCache",
+    "Query" : "Query",
+    "ToDo" : "ToDo",
+    "ToDos" : "ToDos",
+    "LazyToDos" : "LazyToDos",
+    "ToDoTable" : "ToDoTable",
+    "ToDoRecord" : "ToDoTable",
+    "NotebookSync" : "NotebookSync",
+    "NoteChange" : "NotebookSync",
+    "ToDoBins" : "ToDoBins",
+    "NoteIndex" : "NoteIndex",
+    "NotebookIndex" : "NoteIndex",
+    "AsyncEverNote" : "AsyncEverNote",
+    "CreateResult" : "AsyncEverNote",
+    "Daemon" : "Daemon",
+    "DaemonException" : "Daemon",
+    }
+
+__all__ = sorted(_exports) + ["CHECKBOX_HTML"]
+
+class _LazyPackage(types.ModuleType):
+    """Package module importing exported names on first access."""
+
+    def __getattribute__(self, name):
+        value = types.ModuleType.__getattribute__(self, name)
+        if isinstance(value, types.ModuleType) and name in _exports:
+            # Importing a submodule binds it in the package under its
+            # own name, hiding the class of the same name
+            value = getattr(value, name)
+            self.__dict__[name] = value
+        return value
+
+    def __getattr__(self, name):
+        # Only called for names not yet in the package
+        if name not in _exports:
+            raise AttributeError(
+                "'module' object has no attribute '{}'".format(name))
+        module = importlib.import_module("." + _exports[name], __name__)
+        value = getattr(module, name)
+        self.__dict__[name] = value
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_exports))
+
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(globals())
+# Keep the original module alive: when a module is freed, Python 2
+# clears its globals, which the methods above still use
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
@@ -2,16 +2,18 @@
 """Evernote diary manager
 """
 import argparse
+import atexit
 import ConfigParser
-from datetime import date
-import imp
+from datetime import date, timedelta
 import logging
 import os
 import os.path
 import string
 import sys
+import time
 
-from everscript import EverNote, EverNoteException, Plugin
+# everscript loads each class on first use
+import everscript
 
 # Note book containing my diary entries
 DIARY_NOTEBOOK="Diary"
@@ -35,13 +37,67 @@ class MyConfigParser(ConfigParser.SafeConfigParser):
 class PlugInFormatter(string.Formatter):
     """Format strings using plugins for keywords
 
-    Plugins are files in plug_in_path of the form <key>.py"""
+    Plugins are files in plug_in_path of the form <key>.py, or come
+    from installed packages' entry points (see PluginRegistry). Fields
+    naming neither a plugin nor a value passed in raise KeyError
+    before any plugin is built.
 
-    def __init__(self, plug_in_path=None, logger=None, config=None):
+    Before rendering, every plugin referenced by the template is built
+    concurrently on a pool of threads, so a slow plugin does not hold
+    up the others. A plugin which fails, or takes longer than its
+    timeout, renders as placeholder.
+
+    Plugins declaring a cache policy (see Plugin.cache_ttl) have their
+    output taken from plugin_cache, a PluginCache, while it is valid,
+    rather than being built."""
+
+    # Text rendered in place of a plugin which failed or timed out
+    placeholder = "<i>{key} unavailable</i>"
+
+    # Maximum number of plugins built at once
+    max_workers = 8
+
+    def __init__(self, plug_in_path=None, logger=None, config=None,
+                 timeout=60, plugin_cache=None, registry=None):
+        """timeout is the default number of seconds to wait for a plugin.
+
+        A plugin class may override it with its own timeout attribute.
+        plugin_cache is a PluginCache, or None to build every plugin.
+        registry is a PluginRegistry, by default the one shared by
+        formatters using plug_in_path."""
         self.plug_in_path = plug_in_path
+        self.registry = registry or \
+            everscript.PluginRegistry.shared(plug_in_path)
+        self.logger = logger
+        self.timeout = timeout
+        self.plugin_cache = plugin_cache
         self.cache = {}
-        Plugin.set_config(config)
-        Plugin.set_logger(logger)
+        everscript.Plugin.set_config(config)
+        everscript.Plugin.set_logger(logger)
+
+    def render(self, template, values=None):
+        """Build all plugins referenced by Template template, then
+        render it, with other fields filled from dictionary values."""
+        self._check_keys(template.keys, values or {})
+        self._build_plugins(template.keys)
+        return template.render(values, formatter=self)
+
+    def vformat(self, format_string, args, kwargs):
+        """Build all referenced plugins, then format as usual."""
+        keys = self._field_keys(format_string)
+        self._check_keys(keys, kwargs)
+        self._build_plugins(keys)
+        return string.Formatter.vformat(self, format_string, args, kwargs)
+
+    def _check_keys(self, keys, values):
+        """Raise KeyError if any of keys is neither a plugin nor in values."""
+        unknown = [key for key in keys
+                   if key not in values and key not in self.registry]
+        if unknown:
+            raise KeyError(
+                "Unknown template field(s): {} (plug-ins: {})".format(
+                    ", ".join(sorted(unknown)),
+                    ", ".join(self.registry.keys()) or "none"))
 
     def get_value(self, key, args, kwargs):
         """Override default get_value, preferring plugins if found."""
@@ -52,19 +108,192 @@ class PlugInFormatter(string.Formatter):
         # Default to parent...
         return string.Formatter.get_value(self, key, args, kwargs)
 
+    def _field_keys(self, format_string):
+        """Return set of keys referenced by fields in format_string.
+
+        Includes keys of fields nested in format specifications."""
+        keys = set()
+        for literal, field_name, format_spec, conversion in \
+                self.parse(format_string):
+            if field_name is None:
+                continue
+            # Key is the field name up to any attribute or index
+            key, rest = field_name._formatter_field_name_split()
+            if isinstance(key, basestring) and key:
+                keys.add(key)
+            if format_spec:
+                keys.update(self._field_keys(format_spec))
+        return keys
+
+    def _build_plugins(self, keys):
+        """Instantiate plugins for keys concurrently, filling the cache.
+
+        Keys without a plugin are ignored."""
+        classes = {}
+        for key in keys:
+            if key in self.cache:
+                continue
+            # Load modules here rather than in threads, as importing
+            # is serialized anyway
+            try:
+                plugin_class = self._load_plugin_class(key)
+            except Exception as e:
+                # e.g. a syntax or import error in the plug-in
+                self._warning("Plug-in {} failed to load: {}".format(
+                        key, str(e)))
+                self.cache[key] = self.placeholder.format(key=key)
+                continue
+            if not plugin_class:
+                continue
+            if self.plugin_cache:
+                output = self.plugin_cache.lookup(key, plugin_class)
+                if output is not None:
+                    self._debug("Plug-in {}: cache hit".format(key))
+                    self.cache[key] = output
+                    continue
+                if self.plugin_cache.caches(plugin_class):
+                    self._debug("Plug-in {}: cache miss".format(key))
+            classes[key] = plugin_class
+        if not classes:
+            return
+        # Imported here so --help does not load multiprocessing
+        import multiprocessing
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(len(classes), self.max_workers))
+        start = time.time()
+        results = dict((key, pool.apply_async(plugin_class))
+                       for key, plugin_class in classes.items())
+        pool.close()
+        for key, result in results.items():
+            timeout = getattr(classes[key], "timeout", None) or self.timeout
+            remaining = max(0, start + timeout - time.time())
+            try:
+                self.cache[key] = result.get(remaining)
+            except multiprocessing.TimeoutError:
+                self._warning(
+                    "Plug-in {} timed out after {}s".format(key, timeout))
+                self.cache[key] = self.placeholder.format(key=key)
+                continue
+            except Exception as e:
+                self._warning("Plug-in {} failed: {}".format(key, str(e)))
+                self.cache[key] = self.placeholder.format(key=key)
+                continue
+            if self.plugin_cache:
+                try:
+                    self.plugin_cache.store(key, classes[key],
+                                            unicode(self.cache[key]))
+                except Exception as e:
+                    self._warning("Could not cache plug-in {}: {}".format(
+                        key, str(e)))
+
     def _get_plugin(self, key):
         """Load the given plugin"""
-        if not self.plug_in_path:
-            return None
-        plugin_file = os.path.join(self.plug_in_path, key + ".py")
-        if not os.path.exists(plugin_file):
-            return None
         if not self.cache.has_key(key):
-            mod = imp.load_source("everscript.{}".format(key),
-                                  plugin_file)
-            self.cache[key] = mod.Plugin()
+            plugin_class = self._load_plugin_class(key)
+            if plugin_class is None:
+                return None
+            self.cache[key] = plugin_class()
         return self.cache[key]
 
+    def _load_plugin_class(self, key):
+        """Return Plugin class for key, or None if there is no plugin."""
+        return self.registry.plugin_class(key)
+
+    def _debug(self, msg):
+        if self.logger:
+            self.logger.debug(msg)
+
+    def _warning(self, msg):
+        if self.logger:
+            self.logger.warning(msg)
+
+######################################################################
+
+def date_arg(value):
+    """argparse type for dates, e.g. 3/14 or 3/14/15"""
+    day = everscript.ToDo.parse_date(value)
+    if day is None:
+        raise argparse.ArgumentTypeError(
+            "invalid date (expected M/D or M/D/Y): " + value)
+    return day
+
+def diary_title(day):
+    """Return title of the diary for day"""
+    return day.strftime("%B %d, %Y")
+
+def backfill(start, end, args, config, notebook, pluginpath, output):
+    """Create diaries for each day from start to end, inclusive.
+
+    Days which already have a diary are skipped unless args.force.
+    The template is compiled and the calendar read once for the whole
+    range; each day's plugins then render against Plugin.today()."""
+    if start > end:
+        output.error("--from date is after --to date")
+        return(1)
+    days = [start + timedelta(n) for n in range((end - start).days + 1)]
+    if not args.force:
+        existing = set(everscript.EverNote.get_notes_from_notebook(
+            notebook).titles())
+        days = [day for day in days if diary_title(day) not in existing]
+    if not days:
+        output.info("All diaries from {} to {} exist".format(start, end))
+        return(0)
+    output.info("Creating {} diaries from {} to {}".format(
+        len(days), days[0], days[-1]))
+
+    template_title = config.get("Diary", "Template", "Template")
+    template_note = everscript.EverNote.find_note_by_title(
+        template_title, notebook=notebook)
+    if template_note is None:
+        output.error("No diary template: {}".format(template_title))
+        return(1)
+    template = everscript.TemplateCache.shared().template(template_note)
+
+    # Read the calendar once, so the events plugin finds each day cached
+    source = everscript.EventSource.from_config(
+        calendars=config.get("iCal", "Calendars"),
+        ics_path=config.get("iCal", "ICSPath"),
+        logger=output)
+    try:
+        everscript.EventCache.shared().events_for_days(source, days)
+    except (OSError, IOError) as e:
+        output.debug("Error reading events: {}".format(str(e)))
+
+    timeout = float(config.get("Diary", "PlugInTimeout", 60))
+    plugin_cache = everscript.PluginCache.shared() if args.use_cache else None
+    registry = everscript.PluginRegistry.shared(pluginpath)
+
+    def specs():
+        # Rendered as creations complete, one day at a time
+        for day in days:
+            everscript.Plugin.set_day(day)
+            formatter = PlugInFormatter(pluginpath, config=config,
+                                        logger=output, timeout=timeout,
+                                        plugin_cache=plugin_cache,
+                                        registry=registry)
+            yield { "title" : diary_title(day),
+                    "html" : formatter.render(template),
+                    "notebook" : notebook }
+
+    failed = 0
+    try:
+        for result in everscript.AsyncEverNote.create_notes(specs()):
+            if result.error:
+                failed += 1
+                output.error("Error creating diary {}: {}".format(
+                    result.spec["title"], str(result.error)))
+            else:
+                output.info("Created diary: {}".format(result.spec["title"]))
+    except KeyError as e:
+        output.error(e.args[0])
+        return(1)
+    finally:
+        everscript.Plugin.set_day(None)
+    if plugin_cache:
+        output.debug("Plug-in cache: {hits} hits, {misses} misses".format(
+            **plugin_cache.stats()))
+    return(1 if failed else 0)
+
 ######################################################################
 
 def main(argv=None):
@@ -106,17 +335,51 @@ def main(argv=None):
 			action='store_const', const=True,
 			dest="force", default=False,
 			help="Force creation of new diary")
+    parser.add_argument("--from", dest="start", type=date_arg, metavar="DATE",
+			help="create diaries for each day from DATE (M/D or M/D/Y)"
+			" which has none, without opening them")
+    parser.add_argument("--to", dest="end", type=date_arg, metavar="DATE",
+			help="last day for --from (default: today)")
+    parser.add_argument("--no-cache",
+			action="store_false", dest="use_cache", default=True,
+			help="build every plug-in rather than reusing cached output")
+    parser.add_argument("--list-plugins",
+			action="store_true", default=False,
+			help="list the plug-ins templates may use and exit")
+    parser.add_argument("--profile",
+			action="store_true", default=False,
+			help="print time spent in each kind of app call at exit")
+    parser.add_argument("--trace", metavar="FILE",
+			help="append each app call to FILE as JSON lines")
     parser.add_argument("--version", action="version", version="%(prog)s 1.0")
     args = parser.parse_args()
     output_handler.setLevel(args.output_level)
 
+    if args.profile or args.trace:
+	sinks = []
+	if args.profile:
+	    histogram = everscript.HistogramSink()
+	    sinks.append(histogram)
+	    atexit.register(lambda: sys.stderr.write(histogram.summary()))
+	if args.trace:
+	    sinks.append(everscript.JSONLinesSink(args.trace))
+	everscript.TracingBackend.install(*sinks)
+
     config = MyConfigParser()
     conf_path = os.path.expanduser(args.config)
     if os.path.exists(conf_path):
 	output.debug("Parsing configuration file {}".format(args.config))
 	config.read(conf_path)
 
-    title = date.today().strftime("%B %d, %Y")
+    pluginpath = config.get("Diary", "PlugInPath",
+			    os.path.join(os.path.dirname(conf_path), "plugins"))
+    output.debug("Plug-in path: {}".format(pluginpath))
+    if args.list_plugins:
+	for key in everscript.PluginRegistry.shared(pluginpath).keys():
+	    output.info(key)
+	return(0)
+
+    title = diary_title(date.today())
     output.debug("Today's note title is: {}".format(title))
 
     notebook = config.get("Diary", "Notebook")
@@ -124,13 +387,22 @@ def main(argv=None):
 	output.error("No Diary notebook defined in configuration")
 	sys.exit(1)
 
+    if args.start is not None:
+	try:
+	    return backfill(args.start, args.end or date.today(), args,
+			    config, notebook, pluginpath, output)
+	except everscript.EverNoteException as e:
+	    output.exception("Error creating diaries")
+	    return(1)
+
     if args.force:
         output.debug("Forcing creationg of new diary")
         note = None
     else:
         try:
-            note = EverNote.find_note_by_title(title, notebook=notebook)
-        except EverNoteException as e:
+            note = everscript.EverNote.find_note_by_title(title,
+                                                          notebook=notebook)
+        except everscript.EverNoteException as e:
             output.exception("Error trying to find today's diary")
             raise
 
@@ -141,29 +413,42 @@ def main(argv=None):
         try:
             template_title = config.get("Diary", "Template", "Template")
             output.debug("Using template: {}".format(template_title))
-            template_note = EverNote.find_notes(template_title,
-                                                notebook=notebook)[0]
-            template = template_note.content()
-        except EverNoteException as e:
+            template_note = everscript.EverNote.find_note_by_title(
+                template_title, notebook=notebook)
+            if template_note is None:
+                output.error("No diary template: {}".format(template_title))
+                sys.exit(1)
+            # Only fetched and compiled if changed since last used
+            template = everscript.TemplateCache.shared().template(
+                template_note)
+        except everscript.EverNoteException as e:
             output.exception("Error finding diary template")
             sys.exit(1)
 
-        pluginpath = config.get("Diary", "PlugInPath",
-                                os.path.join(os.path.dirname(conf_path),
-                                             "plugins"))
-        output.debug("Plug-in path: {}".format(pluginpath))
-        formatter = PlugInFormatter(pluginpath, config=config, logger=output)
-        html = formatter.format(template)
+        timeout = float(config.get("Diary", "PlugInTimeout", 60))
+        plugin_cache = everscript.PluginCache.shared() \
+            if args.use_cache else None
+        formatter = PlugInFormatter(pluginpath, config=config, logger=output,
+                                    timeout=timeout, plugin_cache=plugin_cache)
+        try:
+            html = formatter.render(template)
+        except KeyError as e:
+            output.error(e.args[0])
+            sys.exit(1)
+        if plugin_cache:
+            output.debug(
+                "Plug-in cache: {hits} hits, {misses} misses".format(
+                    **plugin_cache.stats()))
         try:
-            note = EverNote.create_note(with_html=html,
-                                        title=title,
-                                        notebook=notebook)
-        except EverNoteException as e:
+            note = everscript.EverNote.create_note(with_html=html,
+                                                   title=title,
+                                                   notebook=notebook)
+        except everscript.EverNoteException as e:
             output.exception("Error creating today's diary")
             sys.exit(1)
 
     output.debug("Success. Opening diary: {}".format(title))
-    EverNote.open_note_window(note)
+    everscript.EverNote.open_note_window(note)
     return(0)
 
 if __name__ == "__main__":
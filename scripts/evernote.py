@@ -16,20 +16,21 @@ Scheduled=2a.Scheduled
 [iCal]
 # Calendars to filter on for events (can use UIDs)
 Calendars=Calendar,Informational,Personal,3F0B97F7-0B88-48E3-BDAB-977382767D28
+# Read events from .ics file or directory instead of icalBuddy
+#ICSPath=~/Calendars
 """
 import abc
-from appscript import app
+import atexit
 import argparse
-import cgi
 import ConfigParser
-from datetime import date
+from datetime import date, timedelta
 import logging
-import re
-import subprocess
 import os.path
 import sys
 
-from everscript import EverNote, EverNoteException, ToDos
+# everscript loads each class on first use, so --help and commands
+# served by the daemon only load what they need
+import everscript
 
 ######################################################################
 #
@@ -42,6 +43,13 @@ class Command(object):
     logger = None
     conf = None
 
+    # True when running in the daemon, where results worth keeping
+    # between commands are cached
+    resident = False
+
+    # True if a running daemon may run this command for us
+    served_by_daemon = False
+
     def __init__(self, **kwargs):
 	self.logger = kwargs["logger"]
 	self.conf = kwargs["config"]
@@ -105,7 +113,17 @@ class MissingConfigurationException(CommandException):
 #
 # Commands
 
+def date_arg(string):
+    """Parse date argument given as M/D or M/D/Y, for argparse."""
+    parsed = everscript.ToDo.parse_date(string)
+    if parsed is None:
+	raise argparse.ArgumentTypeError(
+	    "invalid date (expected M/D or M/D/Y): " + string)
+    return parsed
+
 class ToDosCmd(Command):
+    served_by_daemon = True
+
     # Flags for types of todos based on due date
     PAST_DUE = 0x01
     DUE_TODAY = 0x02
@@ -117,24 +135,65 @@ class ToDosCmd(Command):
 	todo_notebook = self.config("ToDos", "NextAction")
 	if not todo_notebook:
 	    raise MissingConfigurationException("No ToDos notebook defined")
-	todos = ToDos(todo_notebook)
-	past_due, due_today, due_soon, due_later, not_due = todos.bin_by_due_date()
+	if args.due_between:
+	    # Range is inclusive of END
+	    start, end = args.due_between
+	    end += timedelta(1)
+	    if everscript.EverNote.index is not None:
+		todos = everscript.EverNote.index.due_between(start, end,
+							       todo_notebook)
+	    else:
+		todos = sorted(everscript.ToDos(todo_notebook).due_between(start,
+									     end),
+			       key=lambda t: t.due_date())
+	    if args.limit is not None:
+		todos = todos[:args.limit]
+	    for todo in todos:
+		self.output(todo.title())
+	    return(0)
+	# Titles are fetched a page at a time as todos are read
+	todos = everscript.LazyToDos(todo_notebook)
+	if len(args.show_flags) == 1 and not self.resident:
+	    # Single list: print todos as they arrive rather than
+	    # waiting for the whole notebook
+	    predicates = {
+		self.PAST_DUE : lambda t: t.past_due(),
+		self.DUE_TODAY : lambda t: t.due_today(),
+		self.DUE_SOON : lambda t: t.due_soon(7),
+		self.DUE_LATER : lambda t: t.due_later(8),
+		self.NO_DUE_DATE : lambda t: t.due_date() is None,
+		}
+	    query = todos.where(predicates[args.show_flags[0]])
+	    if args.limit is not None:
+		# Stops reading pages once enough todos are found
+		query = query.limit(args.limit)
+	    for todo in query:
+		self.output(todo.title())
+	    return(0)
+	if self.resident:
+	    # Reuse bins from earlier commands if the notebook is unchanged
+	    bins = everscript.ToDos.cached_bins(todo_notebook)
+	else:
+	    bins = todos.bin_by_due_date()
 	if args.show_flags == []:
-	    lists = [ past_due, due_today, due_soon, due_later, not_due ]
+	    lists = [ bins.past_due, bins.due_today, bins.due_soon,
+		      bins.due_later, bins.no_due_date ]
 	else:
 	    lists = []
 	    for flag in args.show_flags:
 		if flag == self.PAST_DUE:
-		    lists.append(past_due)
+		    lists.append(bins.past_due)
 		elif flag == self.DUE_TODAY:
-		    lists.append(due_today)
+		    lists.append(bins.due_today)
 		elif flag == self.DUE_SOON:
-		    lists.append(due_soon)
+		    lists.append(bins.due_soon)
 		elif flag == self.DUE_LATER:
-		    lists.append(due_later)
+		    lists.append(bins.due_later)
 		elif flag == self.NO_DUE_DATE:
-		    lists.append(not_due)
+		    lists.append(bins.no_due_date)
 	for list in lists:
+	    if args.limit is not None:
+		list = list[:args.limit]
 	    if len(list) > 0:
 		for todo in list:
 		    self.output(todo.title())
@@ -165,45 +224,39 @@ class ToDosCmd(Command):
 			    dest="show_flags",
 			    action="append_const",
 			    const=cls.DUE_SOON)
-
-######################################################################
-
-# Event as returned from DiaryCmd.get_events()
-class Event(object):
-    def __init__(self, title, location, time,
-		 url=None, phone=None, note=None):
-	self.title = title
-	self.location = location
-	self.time = time
-	self.url = url
-	self.phone = phone
-	self.note = note
-
-    def __str__(self):
-	s = "\"{}\"".format(self.title)
-	s += " time: " + self.time
-	s += " location:" + self.location
-	s += " url:" + self.url if self.url else ""
-	s += " phone:" + self.phone if self.phone else ""
-	s += " note:" + self.note if self.note else ""
-	return s
+	parser.add_argument("--due-between",
+			    nargs=2, type=date_arg, metavar=("START", "END"),
+			    help="Show ToDos due from START to END (M/D or M/D/Y),"
+			    " by due date")
+	parser.add_argument("-n", "--limit",
+			    type=int, default=None,
+			    help="Show at most this many ToDos of each kind")
 
 ######################################################################
 
 class DiaryCmd(Command):
+    served_by_daemon = True
+
     def __init__(self, *args, **kwargs):
 	Command.__init__(self, *args, **kwargs)
-	self.title = date.today().strftime("%B %d, %Y")
+	self.title = self.title_for(date.today())
 	self.notebook = self.config("Diary", "Notebook")
 	if not self.notebook:
 	    raise MissingConfigurationException("No Diary notebook defined")
 
+    @classmethod
+    def title_for(cls, day):
+	"""Return title of the diary for day."""
+	return day.strftime("%B %d, %Y")
+
     def execute(self, args):
+	if args.start is not None:
+	    return self.backfill(args.start, args.end or date.today(), args)
 	self.debug("Today's date is \"{}\" - searching for existing diary".format(self.title))
 	try:
-	    todays_note = EverNote.find_note_by_title(self.title,
-						       notebook=self.notebook)
-	except EverNoteException as e:
+	    todays_note = everscript.EverNote.find_note_by_title(
+		self.title, notebook=self.notebook)
+	except everscript.EverNoteException as e:
 	    self.output("Error trying to find today's diary: " + str(e))
 	    raise
 	if todays_note and not args.force:
@@ -211,109 +264,177 @@ class DiaryCmd(Command):
 		"Opening existing diary: {}".format(todays_note.title()))
 	else:
 	    self.output("Creating new diary for {}".format(self.title))
+	    # Calendar is read while the app is queried for template and todos
+	    events = everscript.AsyncEverNote.submit(self.get_events_as_html)
 	    template = self.get_template()
 	    # XXX decode()s here are hacks until I figure out how to deal
 	    #     with unicode for real.
-	    events = self.get_events_as_html().decode('utf8', 'ignore')
 	    todos = self.get_todos_as_html().decode('utf8', 'ignore')
+	    events = events.get().decode('utf8', 'ignore')
 	    html = template.format(events=events, todos=todos)
 	    try:
-		todays_note = EverNote.create_note(with_html=html,
-						   title=self.title,
-						   notebook=self.notebook)
-	    except EverNoteException as e:
+		todays_note = everscript.EverNote.create_note(
+		    with_html=html, title=self.title, notebook=self.notebook)
+	    except everscript.EverNoteException as e:
 		raise CommandException(
 		    "Error creating today's diary: " + str(e))
-	EverNote.open_note_window(todays_note)
+	everscript.EverNote.open_note_window(todays_note)
 	return(0)
 
+    def backfill(self, start, end, args):
+	"""Create diaries for each day from start to end, inclusive.
+
+	Days which already have a diary are skipped unless args.force.
+	The template, calendar and todos are each read once for the
+	whole range, and notes are created args.jobs at a time."""
+	if start > end:
+	    raise CommandException("--from date is after --to date")
+	days = [start + timedelta(n) for n in range((end - start).days + 1)]
+	if not args.force:
+	    existing = set(everscript.EverNote.get_notes_from_notebook(
+		    self.notebook).titles())
+	    days = [day for day in days if self.title_for(day) not in existing]
+	if not days:
+	    self.output("All diaries from {} to {} exist".format(start, end))
+	    return(0)
+	self.output("Creating {} diaries from {} to {}".format(
+		len(days), days[0], days[-1]))
+	# Calendar is read while the app is queried for template and todos
+	events = everscript.AsyncEverNote.submit(self.get_events_for_days, days)
+	template = self.get_template()
+	todo_bins = self.get_todo_bins(days)
+	events = events.get()
+
+	def specs():
+	    # Built as creations complete, so only a few notes' HTML is
+	    # held at once
+	    for day, bins in zip(days, todo_bins):
+		todos = self.todo_bins_to_html(*bins).decode('utf8', 'ignore')
+		day_events = self.events_to_html(events[day]).decode('utf8',
+								      'ignore')
+		yield { "title" : self.title_for(day),
+			"html" : template.format(events=day_events, todos=todos),
+			"notebook" : self.notebook }
+
+	failed = 0
+	for result in everscript.AsyncEverNote.create_notes(
+		specs(), workers=args.jobs):
+	    if result.error:
+		failed += 1
+		self.output(u"Error creating diary \"{}\": {}".format(
+			result.spec["title"], str(result.error)))
+	    else:
+		self.output(u"Created diary: {}".format(result.spec["title"]))
+	return(1 if failed else 0)
+
     def get_template(self):
+	"""Return diary template as a compiled Template.
+
+	The template note's content is only fetched and compiled when
+	the note has changed since it was last used."""
 	template_note_title = self.config("Diary", "Template")
-	template = ""
+	template = everscript.Template("")
 	if template_note_title:
 	    try:
-		template_notes = EverNote.find_notes(template_note_title,
-						     notebook=self.notebook)
-	    except EverNoteException as e:
+		template_note = everscript.EverNote.find_note_by_title(
+		    template_note_title, notebook=self.notebook)
+	    except everscript.EverNoteException as e:
 		self.output("Error finding diary tempalte: " + str(e))
 		raise
-	    if len(template_notes) > 0:
-		# TODO: find exact note
+	    if template_note:
 		self.debug("Using \"{}\" for template.".format(template_note_title ))
-		template = template_notes[0].content()
+		template = everscript.TemplateCache.shared().template(
+		    template_note)
 	else:
-	    self.debug("No template in use: " + str(e))
+	    self.debug("No template in use")
 	return template
 
-    def get_todos_as_html(self):
-	"""Return list of todos as html"""
+    def get_todos_as_html(self, day=None):
+	"""Return list of todos as of day (default today) as html"""
+	day = day or date.today()
+	return self.todo_bins_to_html(*self.get_todo_bins([day])[0])
+
+    def get_todo_bins(self, days):
+	"""Return list of the Next Action, Pending and Scheduled todos'
+	DueDateBins as of each of days.
 
+	Each notebook is read once, however many days there are."""
 	next_action_notebook = self.config("ToDos", "NextAction")
+	pending_notebook = self.config("ToDos", "Pending")
+	scheduled_notebook = self.config("ToDos", "Scheduled")
 	if next_action_notebook is None:
 	    self.debug("No Next Action notebook defined")
-	    next_action_todos = ToDos()
 	else:
 	    self.debug("Next Action notebook is {}".format(next_action_notebook))
-	    next_action_todos = ToDos(next_action_notebook)
-	    self.debug("Read {} Next Action ToDos".format(len(next_action_todos)))
-
-	pending_notebook = self.config("ToDos", "Pending")
 	if pending_notebook is None:
 	    self.debug("No Pending Todos notebook defined")
-	    pending_todos = ToDos()
-	else:
-	    pending_todos = ToDos(pending_notebook)
-	    self.debug("Read {} Pending ToDos".format(len(pending_todos)))
-
-	scheduled_notebook = self.config("ToDos", "Scheduled")
 	if scheduled_notebook is None:
 	    self.debug("No Scheduled notebook defined")
-	    scheduled_todos = ToDos()
+
+	notebooks = [next_action_notebook, pending_notebook, scheduled_notebook]
+	if self.resident and days == [date.today()]:
+	    # Reuse bins from earlier commands for unchanged notebooks
+	    return [everscript.AsyncEverNote.gather(
+		[everscript.AsyncEverNote.submit(everscript.ToDos.cached_bins,
+						 notebook, days[0])
+		 for notebook in notebooks])]
 	else:
-	    scheduled_todos = ToDos(scheduled_notebook)
+	    # Notebooks are independent, so query them all at once
+	    next_action_todos, pending_todos, scheduled_todos = \
+		everscript.AsyncEverNote.gather_notebooks(notebooks)
+	    self.debug("Read {} Next Action ToDos".format(len(next_action_todos)))
+	    self.debug("Read {} Pending ToDos".format(len(pending_todos)))
 	    self.debug("Read {} Scheduled ToDos".format(len(scheduled_todos)))
 
-	html =""
-	html += "<b>Past due:</b>\n"
-	html += self.todos_to_html(next_action_todos.past_due())
-	html += self.todos_to_html(scheduled_todos.past_due())
+	    # Due dates are parsed once per notebook (see ToDos.table()),
+	    # then binned against each day
+	    return [(next_action_todos.bin_by_due_date(today=day),
+		     pending_todos.bin_by_due_date(today=day),
+		     scheduled_todos.bin_by_due_date(today=day))
+		    for day in days]
+
+    def todo_bins_to_html(self, next_action, pending, scheduled):
+	"""Return html listing todos from the Next Action, Pending and
+	Scheduled todos' DueDateBins."""
+	html = everscript.HTMLRenderer(on_error=self._todo_error)
+	html.section("Past due:")
+	html.todo_list(next_action.past_due)
+	html.todo_list(scheduled.past_due)
 
-	html += "<b>Pending past due:</b>\n"
-	html += self.todos_to_html(pending_todos.past_due())
+	html.section("Pending past due:")
+	html.todo_list(pending.past_due)
 
-	html += "<b>Due today:</b>\n"
-	html += self.todos_to_html(next_action_todos.due_today())
-	html += self.todos_to_html(scheduled_todos.due_today())
+	html.section("Due today:")
+	html.todo_list(next_action.due_today)
+	html.todo_list(scheduled.due_today)
 
-	html += "<b>Pending due today:</b>\n"
-	html += self.todos_to_html(pending_todos.due_today())
+	html.section("Pending due today:")
+	html.todo_list(pending.due_today)
 
-	html += "<b>Due ASAP:</b>\n"
-	html += self.todos_to_html(next_action_todos.due_asap())
+	html.section("Due ASAP:")
+	html.todo_list(next_action.due_asap)
 
-	html += "<b>Pending due ASAP:</b>\n"
-	html += self.todos_to_html(pending_todos.due_asap())
+	html.section("Pending due ASAP:")
+	html.todo_list(pending.due_asap)
 
-	html += "<b>Due soon:</b>\n"
-	html += self.todos_to_html(next_action_todos.due_soon())
+	html.section("Due soon:")
+	html.todo_list(next_action.due_soon)
 
-	html += "<b>Pending due soon:</b>\n"
-	html += self.todos_to_html(pending_todos.due_soon())
+	html.section("Pending due soon:")
+	html.todo_list(pending.due_soon)
 
-	return html
+	return html.getvalue()
 
     def todos_to_html(self, todos):
 	"""Covert a ToDos instance to a hunk of HTML."""
-	html = "<ul>\n"
-	for todo in todos:
-	    try:
-		html += "<li>{}</li>\n".format(cgi.escape(todo.title()))
-	    except Exception as e:
-		self.output(
-		    "Error encoding todo: \"{}\" : {}".format(
-			todo.title(), str(e)))
-	html += "</ul>\n"
-	return html
+	return everscript.HTMLRenderer(on_error=self._todo_error).todo_list(
+	    todos).getvalue()
+
+    def _todo_error(self, todo, e):
+	"""Report a todo which could not be rendered as HTML."""
+	self.output(
+	    "Error encoding todo: \"{}\" : {}".format(
+		todo.title(), str(e)))
 
     def get_events_as_html(self):
 	"""Return list of today's events as html"""
@@ -321,85 +442,42 @@ class DiaryCmd(Command):
 
     def events_to_html(self, events):
 	"""Convert a list of Events to a hunk of HTML."""
-	html = "<ul>\n"
-	for event in events:
-	    html += "<li>{} {}".format(cgi.escape(event.time),
-				       cgi.escape(event.title))
-	    html += "<ul>"
-	    if event.location != "":
-		html += "<li>{}</li>".format(cgi.escape(event.location))
-	    if event.url:
-		html += "<li>{}</li>".format(cgi.escape(event.url))
-	    if event.phone:
-		html += "<li>{}</li>".format(cgi.escape(event.phone))
-	    if event.note:
-		html += "<li>{}</li>".format(cgi.escape(event.note))
-	    html += "</ul></li>\n"
-	html += "</ul>\n"
-	return html
+	return everscript.HTMLRenderer().event_list(events).getvalue()
 
     def get_events(self):
 	"""Return list of Event objects representing today's events
 
-	Requires icalBuddy to be installed in PATH."""
+	Events come from icalBuddy, which must be installed in PATH, or
+	from .ics files if [iCal] ICSPath is set."""
 	self.debug("Getting today's events...")
-
-	icalBuddy = "icalBuddy"
-	cmd = [icalBuddy]
-	cmd.extend(["-b", "* "])  # Event prefix
-	cmd.extend(["-nc"])  # No calendar titles
-
-	# Fields to display, in order
-	fields = "title,datetime,location,notes"
-	cmd.extend(["-iep", fields])
-	cmd.extend(["-po", fields])
-
-	calendars = self.config("iCal", "Calendars")
-	if calendars:
-	    self.debug("Filtering on calendars: " + calendars)
-	    cmd.extend(["-ic", calendars])
-
-	cmd.append("eventsToday")
-	self.debug("Executing: " + " ".join(cmd))
+	source = everscript.EventSource.from_config(
+	    calendars=self.config("iCal", "Calendars"),
+	    ics_path=self.config("iCal", "ICSPath"),
+	    logger=self.logger)
 	try:
-	    out = subprocess.check_output(cmd)
-	except OSError as e:
-	    self.debug("Error executing {}: {}".format(icalBuddy,
-						       str(e)))
+	    events = everscript.EventCache.shared().events(source,
+							    date.today())
+	except (OSError, IOError) as e:
+	    self.debug("Error reading events: {}".format(str(e)))
 	    return []
-	self.debug("Raw icalBuddy output:\n" + out)
-	raw_events = re.split("^\* ", out, flags=re.M)
-
-	events = []
-	for raw_event in raw_events:
-	    # Skip empty events
-	    if re.match(raw_event, "\s*$"):
-		continue
-	    title_match = re.match("(.*)", raw_event, flags=re.M)
-	    title = title_match.group(1) if title_match else ""
-	    time_match = re.search("(\d+:\d+ .M - \d+:\d+ .M)",
-				   raw_event, flags=re.M)
-	    time = time_match.group(1) if time_match else ""
-	    location_match = re.search("location: (.*)",
-				       raw_event, flags=re.M)
-	    location = location_match.group(1) if location_match else ""
-	    notes_match = re.search("notes: (.*)", raw_event, flags=re.DOTALL)
-	    notes = notes_match.group(1) if notes_match else ""
-
-	    # Parse tags out of notes field
-	    url_match = re.search("@url: (\S+)$", notes, flags=re.M)
-	    url = url_match.group(1) if url_match else None
-	    phone_match = re.search("@phone: (.+)$", notes, flags=re.M)
-	    phone = phone_match.group(1) if phone_match else None
-	    note_match = re.search("@note: (.+)$", notes, flags=re.M)
-	    note = note_match.group(1) if note_match else None
-
-	    event = Event(title, location, time,
-			  url=url, phone=phone, note=note)
+	for event in events:
 	    self.debug("Event found:" + str(event))
-	    events.append(event)
 	return events
 
+    def get_events_for_days(self, days):
+	"""Return dictionary of lists of Events on each of days, read
+	from the calendar at once."""
+	self.debug("Getting events from {} to {}...".format(days[0], days[-1]))
+	source = everscript.EventSource.from_config(
+	    calendars=self.config("iCal", "Calendars"),
+	    ics_path=self.config("iCal", "ICSPath"),
+	    logger=self.logger)
+	try:
+	    return everscript.EventCache.shared().events_for_days(source, days)
+	except (OSError, IOError) as e:
+	    self.debug("Error reading events: {}".format(str(e)))
+	    return dict((day, []) for day in days)
+
     @classmethod
     def add_subparser(cls, subparsers):
 	"""Add this command's subparser to the given argparser.
@@ -413,27 +491,202 @@ class DiaryCmd(Command):
 			    action='store_const', const=True,
 			    dest="force", default=False,
 			    help="Force creation of new diary")
+	parser.add_argument("--from",
+			    dest="start", type=date_arg, metavar="DATE",
+			    help="Create diaries for each day from DATE (M/D or"
+			    " M/D/Y) which has none, without opening them")
+	parser.add_argument("--to",
+			    dest="end", type=date_arg, metavar="DATE",
+			    help="Last day for --from (default: today)")
+	parser.add_argument("-j", "--jobs",
+			    type=int, default=4,
+			    help="Diaries created at once with --from (default: 4)")
 
 
 ######################################################################
-#
-# main()
 
-def main(argv=None):
-    # Do argv default this way, as doing it in the functional
-    # declaration sets it at compile time.
-    if argv is None:
-	argv = sys.argv
+class ImportCmd(Command):
+    # Report progress each time this many notes have been processed
+    progress_interval = 100
 
-    # Set up out output via logging module
-    output = logging.getLogger(argv[0])
-    output.setLevel(logging.DEBUG)
-    output_handler = logging.StreamHandler(sys.stdout)  # Default is sys.stderr
-    # Set up formatter to just print message without preamble
-    output_handler.setFormatter(logging.Formatter("%(message)s"))
-    output.addHandler(output_handler)
+    def execute(self, args):
+	if args.source != "-" and not os.path.exists(
+	    os.path.expanduser(args.source)):
+	    raise CommandException("No such file or directory: {}".format(
+		    args.source))
+	if os.path.isdir(os.path.expanduser(args.source)):
+	    specs = self.directory_specs(os.path.expanduser(args.source))
+	else:
+	    specs = self.json_lines_specs(args.source)
+	if args.notebook:
+	    specs = self.with_notebook(specs, args.notebook)
+	created = failed = 0
+	results = everscript.AsyncEverNote.create_notes(specs,
+							retries=args.retries,
+							workers=args.jobs)
+	for result in results:
+	    if result.error:
+		failed += 1
+		self.output(u"Failed to create \"{}\" after {} attempt(s): {}".format(
+			result.spec.get("title", ""), result.attempts,
+			str(result.error)))
+	    else:
+		created += 1
+		self.debug(u"Created \"{}\"".format(result.spec.get("title", "")))
+	    if (created + failed) % self.progress_interval == 0:
+		self.info("{} notes processed...".format(created + failed))
+	self.output("Created {} notes, {} failed".format(created, failed))
+	return(1 if failed else 0)
+
+    def json_lines_specs(self, path):
+	"""Yield note specs read from a file with a JSON object per line.
+
+	path of "-" means standard input."""
+	# Imported here so --help does not load json
+	import json
+	f = sys.stdin if path == "-" else open(os.path.expanduser(path))
+	try:
+	    for number, line in enumerate(f, 1):
+		if not line.strip():
+		    continue
+		try:
+		    spec = json.loads(line)
+		except ValueError as e:
+		    raise CommandException("{} line {}: {}".format(
+			    path, number, str(e)))
+		if not isinstance(spec, dict) or "title" not in spec:
+		    raise CommandException(
+			"{} line {}: expected an object with a title".format(
+			    path, number))
+		yield spec
+	finally:
+	    if f is not sys.stdin:
+		f.close()
+
+    def directory_specs(self, path):
+	"""Yield a note spec for each file in directory path.
+
+	The title is the file name without its extension. Files ending
+	in .html or .htm are imported as HTML, others as text."""
+	for name in sorted(os.listdir(path)):
+	    file_path = os.path.join(path, name)
+	    if name.startswith(".") or not os.path.isfile(file_path):
+		continue
+	    title, extension = os.path.splitext(name)
+	    with open(file_path) as f:
+		# XXX decode() as in DiaryCmd until unicode is dealt with
+		content = f.read().decode('utf8', 'ignore')
+	    if extension.lower() in (".html", ".htm"):
+		yield { "title" : title, "html" : content }
+	    else:
+		yield { "title" : title, "text" : content }
+
+    def with_notebook(self, specs, notebook):
+	"""Yield specs, putting those without a notebook in notebook."""
+	for spec in specs:
+	    if not spec.get("notebook"):
+		spec = dict(spec)
+		spec["notebook"] = notebook
+	    yield spec
 
-    # Argument parsing
+    @classmethod
+    def add_subparser(cls, subparsers):
+	"""Add this command's subparser to the given argparser.
+
+	subparsers should be the action returned from ArgumentParser.add_subparsers()
+	Returns nothing.
+	"""
+	parser = subparsers.add_parser(
+	    "import",
+	    help="create notes in bulk",
+	    description="Create notes from SOURCE, either a file (- for"
+	    " standard input) with a JSON object per line, such as"
+	    " {\"title\": \"Call Bob\", \"text\": \"...\","
+	    " \"notebook\": \"Inbox\"} (or \"html\" instead of \"text\"),"
+	    " or a directory, where each file becomes a note titled with"
+	    " its name. Notes are created several at a time and transient"
+	    " errors are retried.")
+	parser.set_defaults(cmd_class=cls)
+	parser.add_argument("source", metavar="SOURCE",
+			    help="JSON lines file or directory")
+	parser.add_argument("-N", "--notebook",
+			    help="notebook for notes which do not name one")
+	parser.add_argument("-j", "--jobs",
+			    type=int, default=4,
+			    help="notes to create at once (default: 4)")
+	parser.add_argument("--retries",
+			    type=int, default=2,
+			    help="times to retry a transient error (default: 2)")
+
+######################################################################
+
+class DaemonCmd(Command):
+    def execute(self, args):
+	if args.stop:
+	    if everscript.Daemon.stop(args.socket):
+		self.output("Daemon stopped")
+	    else:
+		self.output("No daemon running on {}".format(args.socket))
+	    return(0)
+	# Commands run from now on keep their results warm
+	Command.resident = True
+	self.config_path = os.path.abspath(os.path.expanduser(args.config))
+	self.info("Serving commands on {}".format(args.socket))
+	try:
+	    everscript.Daemon(self.run_request, path=args.socket,
+		   logger=self.logger).serve()
+	except everscript.DaemonException as e:
+	    raise CommandException(str(e))
+	return(0)
+
+    def run_request(self, argv, output, cwd=None):
+	"""Run the command line argv for a client, logging to output.
+
+	Relative paths in argv are taken from cwd, the client's working
+	directory. Uses the configuration the daemon was started with,
+	unless argv names another configuration file. Returns the
+	command's exit status."""
+	args = make_parser().parse_args(argv)
+	output.setLevel(args.output_level)
+	if cwd:
+	    args.config = os.path.join(cwd, os.path.expanduser(args.config))
+	if not args.cmd_class.served_by_daemon:
+	    output.error("The daemon does not run this command")
+	    return(1)
+	if os.path.abspath(os.path.expanduser(args.config)) == self.config_path:
+	    config = self.conf
+	else:
+	    config = read_config(args.config, output)
+	return run_command(args, config, output)
+
+    @classmethod
+    def add_subparser(cls, subparsers):
+	"""Add this command's subparser to the given argparser.
+
+	subparsers should be the action returned from ArgumentParser.add_subparsers()
+	Returns nothing.
+	"""
+	parser = subparsers.add_parser(
+	    "daemon",
+	    help="serve commands from a resident process",
+	    description="Keep the app connection and caches warm and run"
+	    " the todos and diary commands for other invocations of this"
+	    " script, which use the daemon whenever it is running."
+	    " Commands are run one at a time, so a long one (e.g."
+	    " diary --from) makes others wait for it."
+	    " Options such as --memory and --latency given to the daemon"
+	    " apply to every command it runs.")
+	parser.set_defaults(cmd_class=cls)
+	parser.add_argument("--stop",
+			    action="store_true", default=False,
+			    help="Stop the running daemon")
+
+######################################################################
+#
+# main()
+
+def make_parser():
+    """Return ArgumentParser for the command line."""
     parser = argparse.ArgumentParser(
 	description=__doc__, # printed with -h/--help
 	# Don't mess with format of description
@@ -454,6 +707,40 @@ def main(argv=None):
     parser.add_argument("-c", "--config",
 			default="~/.evernote/config",
 			help="specify configuration file")
+    parser.add_argument("--no-cache",
+			action="store_false", dest="use_cache", default=True,
+			help="don't use cached search results")
+    parser.add_argument("--max-age",
+			type=float, default=None, metavar="SECONDS",
+			help="use cached search results and index this new"
+			" without checking the notebook has changed, so"
+			" missing changes made since (default: always check"
+			" search results, sync the index once a minute)")
+    parser.add_argument("--index",
+			action="store_true", dest="use_index", default=False,
+			help="look up notes by title and due date in a local"
+			" index, kept up to date from the notebooks, rather"
+			" than searching")
+    parser.add_argument("--memory",
+			type=int, default=None, metavar="COUNT",
+			help="use an in-memory store of COUNT synthetic todos"
+			" instead of EverNote (for benchmarking)")
+    parser.add_argument("--latency",
+			type=float, default=None, metavar="SECONDS",
+			help="add SECONDS of simulated latency to every call")
+    parser.add_argument("--profile",
+			action="store_true", default=False,
+			help="print time spent in each kind of app call at exit")
+    parser.add_argument("--trace", metavar="FILE",
+			help="append each app call to FILE as JSON lines")
+    # Daemon.DEFAULT_PATH, spelt out so parsing does not import
+    # Daemon (and socket, SocketServer)
+    parser.add_argument("--socket",
+			default="~/.evernote/daemon.sock", metavar="PATH",
+			help="socket of the daemon (default: %(default)s)")
+    parser.add_argument("--no-daemon",
+			action="store_false", dest="use_daemon", default=True,
+			help="run the command here even if a daemon is running")
     parser.add_argument("--version", action="version", version="%(prog)s 1.0")
 
     subparsers = parser.add_subparsers(help="Commands")
@@ -461,23 +748,120 @@ def main(argv=None):
     for cmd in Command.__subclasses__():
 	cmd.add_subparser(subparsers)
 
-    args = parser.parse_args()
-    output_handler.setLevel(args.output_level)
+    return parser
 
+def read_config(path, output):
+    """Return configuration read from path, if it exists."""
     config = ConfigParser.SafeConfigParser()
-    conf_path = os.path.expanduser(args.config)
+    conf_path = os.path.expanduser(path)
     if os.path.exists(conf_path):
-	output.debug("Parsing configuration file {}".format(args.config))
+	output.debug("Parsing configuration file {}".format(path))
 	config.read(conf_path)
-
+    return config
+
+def setup(args, config):
+    """Set up the backend and caches as given by args.
+
+    These last for the whole process, so a daemon keeps the settings
+    it was started with."""
+    if args.memory is not None:
+	notebook = config.get("ToDos", "NextAction") \
+	    if config.has_option("ToDos", "NextAction") else "Next Action"
+	if not config.has_section("ToDos"):
+	    config.add_section("ToDos")
+	config.set("ToDos", "NextAction", notebook)
+	backend = everscript.MemoryBackend().seed(args.memory,
+						  notebook=notebook)
+	# Cache would outlive the in-memory notes
+	args.use_cache = False
+    else:
+	backend = everscript.AppscriptBackend()
+    if args.latency is not None:
+	backend = everscript.LatencyBackend(backend, latency=args.latency)
+    everscript.EverNote.set_backend(backend)
+
+    if args.profile or args.trace:
+	sinks = []
+	if args.profile:
+	    histogram = everscript.HistogramSink()
+	    sinks.append(histogram)
+	    atexit.register(lambda: sys.stderr.write(histogram.summary()))
+	if args.trace:
+	    sinks.append(everscript.JSONLinesSink(args.trace))
+	everscript.TracingBackend.install(*sinks)
+
+    if args.use_cache:
+	everscript.EverNote.set_cache(
+	    everscript.NoteCache(max_age=args.max_age or 0))
+
+    if args.use_index:
+	# Not persisted for in-memory notes, like the cache
+	path = everscript.NoteIndex.DEFAULT_PATH \
+	    if args.memory is None else None
+	max_age = args.max_age
+	if max_age is None:
+	    max_age = everscript.NoteIndex.DEFAULT_MAX_AGE
+	# Only titles and due dates are looked up, so contents are not
+	# fetched or indexed
+	everscript.EverNote.set_index(
+	    everscript.NoteIndex(path, max_age=max_age, content=False))
+
+def use_daemon(parser, args):
+    """Return True if the command in args may be sent to a daemon.
+
+    Commands asking for their own backend or caches run here."""
+    if not args.use_daemon or not args.cmd_class.served_by_daemon:
+	return False
+    return (args.memory is None and args.latency is None and
+	    not args.profile and not args.trace and args.use_cache and
+	    not args.use_index and
+	    args.max_age == parser.get_default("max_age"))
+
+def run_command(args, config, output):
+    """Run the command given by args, returning its exit status."""
     try:
 	cmd = args.cmd_class(config=config, logger=output)
 	result = cmd.execute(args)
+	output.debug(
+	    "Note property cache: {hits} hits, {misses} misses".format(
+		**everscript.Note.cache_stats()))
     except CommandException as e:
 	output.error(str(e))
 	result = 1
-
     return(result)
 
+def main(argv=None):
+    # Do argv default this way, as doing it in the functional
+    # declaration sets it at compile time.
+    if argv is None:
+	argv = sys.argv
+
+    # Set up out output via logging module
+    output = logging.getLogger(argv[0])
+    output.setLevel(logging.DEBUG)
+    output_handler = logging.StreamHandler(sys.stdout)  # Default is sys.stderr
+    # Set up formatter to just print message without preamble
+    output_handler.setFormatter(logging.Formatter("%(message)s"))
+    output.addHandler(output_handler)
+
+    # Argument parsing
+    parser = make_parser()
+    args = parser.parse_args(argv[1:])
+    output_handler.setLevel(args.output_level)
+
+    if use_daemon(parser, args):
+	try:
+	    result = everscript.Daemon.call(argv[1:], output, path=args.socket)
+	except everscript.DaemonException as e:
+	    output.error(str(e))
+	    return(1)
+	if result is not None:
+	    return(result)
+	output.debug("No daemon running, running command here")
+
+    config = read_config(args.config, output)
+    setup(args, config)
+    return run_command(args, config, output)
+
 if __name__ == "__main__":
     sys.exit(main())
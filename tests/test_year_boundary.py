@@ -0,0 +1,64 @@
+"""Due dates without a year across New Year, as seen by a long-running
+process such as the daemon"""
+
+import datetime
+import importlib
+import types
+import unittest
+
+ToDoModule = importlib.import_module("everscript.ToDo")
+ToDo = ToDoModule.ToDo
+NoteChange = importlib.import_module("everscript.NotebookSync").NoteChange
+ToDoBins = importlib.import_module("everscript.ToDoBins").ToDoBins
+
+class FakeDate(datetime.date):
+    """datetime.date whose today() is FakeDate.current"""
+
+    current = None
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+class YearBoundaryTest(unittest.TestCase):
+
+    def setUp(self):
+        # ToDo reads the year from datetime.date.today()
+        fake = types.ModuleType("datetime")
+        fake.__dict__.update(datetime.__dict__)
+        fake.date = FakeDate
+        self.real_datetime = ToDoModule.datetime
+        ToDoModule.datetime = fake
+        self.set_today(datetime.date(2026, 12, 31))
+
+    def tearDown(self):
+        ToDoModule.datetime = self.real_datetime
+
+    def set_today(self, day):
+        FakeDate.current = FakeDate(day.year, day.month, day.day)
+        return FakeDate.current
+
+    def todo(self, title):
+        todo = ToDo(None, link="link:" + title)
+        todo.set_cached("title", title)
+        return todo
+
+    def test_due_date_follows_year(self):
+        todo = self.todo("Call Bob due: 1/5")
+        self.assertEqual(todo.due_date(), datetime.date(2026, 1, 5))
+        self.set_today(datetime.date(2027, 1, 2))
+        self.assertEqual(todo.due_date(), datetime.date(2027, 1, 5))
+
+    def test_bins_follow_year(self):
+        todo = self.todo("Call Bob due: 1/5")
+        bins = ToDoBins()
+        bins.apply([NoteChange(NoteChange.ADDED, todo.link(), todo)])
+        before = bins.bins(self.set_today(datetime.date(2026, 12, 31)))
+        self.assertEqual(len(before.past_due), 1)
+        after = bins.bins(self.set_today(datetime.date(2027, 1, 2)))
+        self.assertEqual(len(after.past_due), 0)
+        self.assertEqual([t.due_date() for t in after.due_soon],
+                         [datetime.date(2027, 1, 5)])
+
+if __name__ == "__main__":
+    unittest.main()